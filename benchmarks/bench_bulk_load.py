@@ -0,0 +1,64 @@
+"""
+Compare DataFrame.to_sql(if_exists="replace") with bulk_load.copy_dataframe on a synthetic roster snapshot.
+
+Usage: DATABASE_URL=... python benchmarks/bench_bulk_load.py [rows]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bulk_load import copy_dataframe  # noqa: E402
+from db import get_engine  # noqa: E402
+
+TABLE = "bench_stg_swgoh_ss_player"
+
+
+def synthetic_roster(rows: int):
+    rng = np.random.default_rng(42)
+    return pd.DataFrame({
+        "player_id": [f"player{i % 500}" for i in range(rows)],
+        "base_id": [f"UNIT{i % 250}" for i in range(rows)],
+        "gear": rng.integers(1, 14, rows),
+        "relic": rng.integers(-3, 10, rows),
+        "level": rng.integers(1, 86, rows),
+        "stars": rng.integers(1, 8, rows),
+        "gp": rng.integers(1000, 40000, rows),
+        "date": "20240101",
+    })
+
+
+def timed(label, func):
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28}{elapsed:8.2f}s")
+    return elapsed
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    df = synthetic_roster(rows)
+    engine = get_engine()
+    print(f"{rows} rows")
+
+    def to_sql_replace():
+        with engine.begin() as connection:
+            df.to_sql(TABLE, con=connection, if_exists="replace", index=False)
+
+    def copy_truncate():
+        with engine.begin() as connection:
+            copy_dataframe(connection, df, TABLE)
+
+    baseline = timed("to_sql(if_exists='replace')", to_sql_replace)
+    copy = timed("copy_dataframe", copy_truncate)
+    print(f"speedup{baseline / copy:21.1f}x")
+
+    with engine.begin() as connection:
+        connection.execute(text(f'DROP TABLE IF EXISTS "{TABLE}"'))
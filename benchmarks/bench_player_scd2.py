@@ -0,0 +1,141 @@
+"""
+Compare the correlated-subquery SCD2 update of upsert_players() with the set-based merge_swgoh_players()
+(sql_scripts/migrations/003_player_scd2_merge.sql) on a synthetic player dimension.
+
+Every table lives in the bench_scd2 schema, which is dropped at the end.
+
+Usage: DATABASE_URL=... python benchmarks/bench_player_scd2.py [players] [--legacy-timeout 600]
+"""
+import argparse
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db import get_engine  # noqa: E402
+from migrate import MIGRATIONS_DIR  # noqa: E402
+
+SCHEMA = "bench_scd2"
+MERGE_MIGRATION = os.path.join(MIGRATIONS_DIR, "003_player_scd2_merge.sql")
+
+# Current dimension of `players` players in 50-player guilds, with one expired version each (row_hash is filled
+# by the migration), and a staging snapshot where 5% were renamed, 1% moved guild, 1% left and 1% are new
+SETUP = """
+    CREATE TABLE d_player (
+        id serial PRIMARY KEY, player_id varchar(50), name varchar(255), allycode varchar(50),
+        start_date date, end_date date, current_flag bool, UNIQUE (player_id, start_date)
+    );
+    CREATE TABLE stg_player (player_id text, name text, allycode text);
+    CREATE TABLE d_swgoh_player (
+        id serial PRIMARY KEY, player_id varchar(50), name varchar(255), allycode varchar(50),
+        start_date date, end_date date, current_flag bool, guild_id varchar(255), UNIQUE (player_id, start_date)
+    );
+    CREATE TABLE stg_swgoh_player (player_id text, name text, allycode text, guild_id text);
+
+    INSERT INTO d_player (player_id, name, allycode, start_date, end_date, current_flag)
+    SELECT 'p' || i, 'old name ' || i, (100000000 + i)::text, current_date - 60, current_date - 31, false
+    FROM generate_series(1, {players}) i
+    UNION ALL
+    SELECT 'p' || i, 'name ' || i, (100000000 + i)::text, current_date - 30, NULL, true
+    FROM generate_series(1, {players}) i;
+    INSERT INTO d_swgoh_player (player_id, name, allycode, start_date, end_date, current_flag, guild_id)
+    SELECT player_id, name, allycode, start_date, end_date, current_flag,
+           'guild' || (substr(player_id, 2)::int / 50)
+    FROM d_player;
+
+    INSERT INTO stg_swgoh_player (player_id, name, allycode, guild_id)
+    SELECT 'p' || i,
+           CASE WHEN i % 20 = 0 THEN 'new name ' || i ELSE 'name ' || i END,
+           (100000000 + i)::text,
+           'guild' || CASE WHEN i % 100 = 1 THEN i / 50 + 1 ELSE i / 50 END
+    FROM generate_series(1, {players}) i
+    WHERE i % 100 <> 2
+    UNION ALL
+    SELECT 'n' || i, 'name n' || i, (900000000 + i)::text, 'guild' || (i / 50)
+    FROM generate_series(1, {players} / 100) i;
+    INSERT INTO stg_player (player_id, name, allycode) SELECT player_id, name, allycode FROM stg_swgoh_player;
+    ANALYZE;
+"""
+
+# Body of upsert_players() in sql_scripts/functions.sql
+LEGACY_UPSERT = """
+    UPDATE d_player
+    SET end_date = CURRENT_DATE - INTERVAL '1 day',
+        current_flag = FALSE
+    WHERE player_id IN (
+        SELECT player_id
+        FROM stg_player
+    )
+    AND current_flag = TRUE
+    AND name <> (
+        SELECT name
+        FROM stg_player
+        WHERE stg_player.player_id = d_player.player_id
+    );
+
+    INSERT INTO d_player (player_id, name, allycode, start_date, end_date, current_flag)
+    SELECT player_id, name, allycode, CURRENT_DATE, NULL, TRUE
+    FROM stg_player
+    ON CONFLICT (player_id, start_date) DO NOTHING;
+"""
+
+
+def timed(label, func):
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28}{elapsed:8.2f}s")
+    return elapsed, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Player SCD2 merge benchmark")
+    parser.add_argument("players", nargs="?", type=int, default=100_000)
+    parser.add_argument("--legacy-timeout", type=int, default=600, help="Seconds before upsert_players is stopped.")
+    args = parser.parse_args()
+
+    load_dotenv()
+    engine = get_engine()
+    with engine.connect() as connection:
+        cursor = connection.connection.cursor()
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}; "
+                       f"SET search_path TO {SCHEMA}, public")
+        try:
+            _, _ = timed(f"setup ({args.players} players)", lambda: cursor.execute(SETUP.format(players=args.players)))
+            with open(MERGE_MIGRATION, encoding="utf-8") as file:
+                cursor.execute(file.read())
+            connection.commit()
+
+            def legacy():
+                cursor.execute(f"SET statement_timeout = {args.legacy_timeout * 1000}")
+                try:
+                    cursor.execute(LEGACY_UPSERT)
+                    connection.commit()
+                    return True
+                except Exception as e:
+                    connection.rollback()
+                    print(f"upsert_players stopped: {e}".strip())
+                    return False
+                finally:
+                    cursor.execute("SET statement_timeout = 0")
+
+            def merge():
+                cursor.execute("SELECT * FROM merge_swgoh_players()")
+                counts = cursor.fetchone()
+                connection.commit()
+                return counts
+
+            baseline, finished = timed("upsert_players()", legacy)
+            merged, counts = timed("merge_swgoh_players()", merge)
+            print(f"inserted {counts[0]}, expired {counts[1]}, unchanged {counts[2]}")
+            if finished:
+                print(f"speedup{baseline / merged:21.1f}x")
+            else:
+                print(f"speedup{'>':>15}{baseline / merged:.1f}x")
+        finally:
+            connection.rollback()
+            connection.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+            connection.commit()
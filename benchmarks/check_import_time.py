@@ -0,0 +1,61 @@
+"""
+Measure the import time of the bot (or another module) with `python -X importtime` and fail when it regresses:
+either the cumulative time goes over the budget or a heavy library that should load on first use is imported.
+
+Usage: python benchmarks/check_import_time.py [module] [--budget-ms 600] [--top 15]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Libraries the bot must not import at startup (see bot_utils, bot_render, db and logger)
+LAZY_MODULES = {
+    "bot": ["pandas", "numpy", "matplotlib", "PIL", "sqlalchemy"],
+}
+
+
+def import_times(module: str):
+    """Run `python -X importtime -c 'import module'` and return {module: (self us, cumulative us)}."""
+    env = {**os.environ, "CHANNEL_ID": os.getenv("CHANNEL_ID", "0")}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if self_us.isdigit():
+            times[name] = (int(self_us), int(cumulative_us))
+    return times
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import time check")
+    parser.add_argument("module", nargs="?", default="bot")
+    parser.add_argument("--budget-ms", type=float, default=600)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    times = import_times(args.module)
+    total_ms = times[args.module][1] / 1000
+    print(f"{'module':<48}{'cumulative':>12}")
+    for name, (_, cumulative) in sorted(times.items(), key=lambda item: -item[1][1])[:args.top]:
+        print(f"{name:<48}{cumulative / 1000:10.1f}ms")
+
+    failures = []
+    if total_ms > args.budget_ms:
+        failures.append(f"import {args.module} took {total_ms:.0f}ms (budget {args.budget_ms:.0f}ms)")
+    eager = [name for name in LAZY_MODULES.get(args.module, []) if name in times]
+    if eager:
+        failures.append(f"import {args.module} loads {', '.join(eager)} at startup")
+
+    print(f"\nimport {args.module}: {total_ms:.0f}ms")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
@@ -2,23 +2,32 @@ import discord
 import os
 from discord.ext import commands
 from dotenv import load_dotenv
-from bot_tasks import af_tickets, ah_tickets, af_tickets_missed, ah_tickets_missed, load_messages
+from bot_commands import REPORT_COMMANDS
+from bot_tasks import JOB_HANDLERS
+from bot_utils import warm_up_renderer
+from disc_capture import DiscordCapture
 from logger import setup_logging
+from report_cache import report_cache
+from scheduler import Scheduler
 
 load_dotenv()
 logger = setup_logging()
 intents = discord.Intents.all()
 bot = commands.Bot(command_prefix=".", intents=intents)
+for command in REPORT_COMMANDS:
+    bot.add_command(command)
+capture = DiscordCapture(bot)
+capture.register()
+scheduler = Scheduler(bot, {**JOB_HANDLERS, "messages": capture.reconcile})
 
 
 @bot.event
 async def on_ready():
+    report_cache.start_listener()
     logger.info("Starting schedules...")
-    af_tickets.start(bot)
-    ah_tickets.start(bot)
-    af_tickets_missed.start(bot)
-    ah_tickets_missed.start(bot)
-    load_messages.start(bot)
+    scheduler.start()
+    capture.start()
+    warm_up_renderer()
 
     await bot.change_presence(activity=discord.Game(name="Star Wars: Galaxy of Heroes"))
     logger.info("Bot is now connected and ready to go!")
@@ -0,0 +1,119 @@
+import os
+import time
+import discord
+from io import BytesIO
+from discord.ext import commands
+from dotenv import load_dotenv
+from logger import setup_logging
+from bot_utils import format_embed, get_guilds
+from report_cache import report_cache
+
+logger = setup_logging()
+load_dotenv()
+
+MAX_MISSED_DAYS = 90  # Upper bound of the days argument, which also bounds the cached reports per guild
+DEFAULT_MISSED_DAYS = 7
+GUILD_LIST_TTL = 300  # seconds the guild list used to resolve names is reused
+
+# Each user may run COMMAND_USER_RATE report commands every COMMAND_USER_PER seconds,
+# and each Discord server COMMAND_SERVER_RATE commands every COMMAND_SERVER_PER seconds
+USER_COOLDOWNS = commands.CooldownMapping.from_cooldown(
+    int(os.getenv("COMMAND_USER_RATE", "2")), float(os.getenv("COMMAND_USER_PER", "30")), commands.BucketType.user)
+SERVER_COOLDOWNS = commands.CooldownMapping.from_cooldown(
+    int(os.getenv("COMMAND_SERVER_RATE", "10")), float(os.getenv("COMMAND_SERVER_PER", "60")), commands.BucketType.guild)
+
+_guilds = {}
+_guilds_loaded_at = 0.0
+
+
+def report_cooldown():
+    """
+    Check that applies the per-user and per-server cooldowns of the report commands.
+    A token is only spent once both buckets allow the command.
+    """
+    async def predicate(ctx):
+        buckets = [(mapping, mapping.get_bucket(ctx.message)) for mapping in (USER_COOLDOWNS, SERVER_COOLDOWNS)]
+        for mapping, bucket in buckets:
+            retry_after = bucket.get_retry_after()
+            if retry_after:
+                raise commands.CommandOnCooldown(bucket, retry_after, mapping.type)
+        for _, bucket in buckets:
+            bucket.update_rate_limit()
+        return True
+    return commands.check(predicate)
+
+
+async def resolve_guild(query: str):
+    """
+    Function that resolves a guild id or (case-insensitive) guild name to (guild_id, name).
+    Returns None if the guild is unknown.
+    """
+    global _guilds, _guilds_loaded_at
+    query = query.strip()
+    for attempt in range(2):
+        if attempt or time.monotonic() - _guilds_loaded_at > GUILD_LIST_TTL:
+            _guilds = await get_guilds()
+            _guilds_loaded_at = time.monotonic()
+        for guild_id, name in _guilds.items():
+            if query == guild_id or query.lower() == (name or "").lower():
+                return guild_id, name
+    return None
+
+
+@commands.command(name="tickets")
+@report_cooldown()
+async def tickets(ctx, *, guild: str):
+    """Sends the ticket chart of the last 7 days of a guild: .tickets <guild name or id>"""
+    resolved = await resolve_guild(guild)
+    if resolved is None:
+        await ctx.reply(f"Guild '{guild}' not found.")
+        return
+    guild_id, guild_name = resolved
+    logger.info(f"{ctx.author} requested the ticket report for '{guild_name}'.")
+
+    async with ctx.typing():
+        report = await report_cache.get_ticket_chart(guild_id)
+    if report is None:
+        await ctx.reply(f"No ticket data found for {guild_name}.")
+        return
+    await ctx.reply(file=discord.File(fp=BytesIO(report), filename="tickets.png"))
+
+
+@commands.command(name="missed", usage="<guild> [days]")
+@report_cooldown()
+async def missed(ctx, *, query: str):
+    """Sends the missed tickets report of a guild: .missed <guild name or id> [days]"""
+    guild, days = query, DEFAULT_MISSED_DAYS
+    parts = query.rsplit(maxsplit=1)
+    if len(parts) == 2 and parts[1].isdigit():
+        guild, days = parts[0], int(parts[1])
+    if not 1 <= days <= MAX_MISSED_DAYS:
+        await ctx.reply(f"Days must be between 1 and {MAX_MISSED_DAYS}.")
+        return
+
+    resolved = await resolve_guild(guild)
+    if resolved is None:
+        await ctx.reply(f"Guild '{guild}' not found.")
+        return
+    guild_id, guild_name = resolved
+    logger.info(f"{ctx.author} requested the missed tickets report for '{guild_name}' over {days} days.")
+
+    async with ctx.typing():
+        df = await report_cache.get_tickets_missed(guild_id, str(days))
+    await ctx.reply(embed=format_embed(df, guild_name, str(days)))
+
+
+@tickets.error
+@missed.error
+async def report_command_error(ctx, error):
+    if isinstance(error, commands.CommandOnCooldown):
+        await ctx.reply(f"Slow down! Try again in {error.retry_after:.0f}s.")
+    elif isinstance(error, commands.MissingRequiredArgument):
+        await ctx.reply(f"Usage: .{ctx.command.name} {ctx.command.usage or ctx.command.signature}")
+    else:
+        logger.error(f"Error running command '{ctx.command.name}': {error}")
+        await ctx.reply("Could not build the report, please try again later.")
+
+
+# Registered in bot.py
+REPORT_COMMANDS = [tickets, missed]
@@ -0,0 +1,130 @@
+import os
+import threading
+from functools import lru_cache
+from io import BytesIO
+from random import choice
+
+import matplotlib
+import matplotlib.dates as mdates
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from PIL import Image
+
+from logger import setup_logging
+
+# Imported on first use by bot_utils.render_ticket_report, on the render pool
+matplotlib.use("Agg")
+logger = setup_logging()
+
+RAID_PATH = ["./data/naboo.png"]  # Path for the background image used in the plot
+BACKGROUND_CACHE_SIZE = 16  # Decoded and resized background images kept in memory
+PNG_COMPRESS_LEVEL = 1  # Fast zlib level: encoding dominates render time, size stays well under Discord's limit
+
+
+@lru_cache(maxsize=BACKGROUND_CACHE_SIZE)
+def load_background(img_path: str, width: int, height: int):
+    """
+    Function that decodes a background image and resizes it to the figure size once per (path, size).
+    Returns a read-only array shared by every render.
+    """
+    logger.info(f"Loading background image {img_path} at {width}x{height}")
+    img = np.array(Image.open(img_path).resize((width, height), Image.LANCZOS))
+    img.setflags(write=False)
+    return img
+
+
+class TicketReportTemplate:
+    """
+    Styled ticket report figure that is built once and reused: each render only swaps the data series,
+    title, annotations and background. Not thread-safe, use one template per thread (see get_report_template).
+    """
+
+    def __init__(self):
+        self.fig = Figure(figsize=(10, 8), facecolor='#333333')  # Create figure with the background color
+        FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot()
+        self.size = (int(self.fig.get_size_inches()[0] * self.fig.dpi), int(self.fig.get_size_inches()[1] * self.fig.dpi))
+        self.background = None
+        self.annotations = []
+        self.layout_key = None  # (points, title length) the current layout was computed for
+
+        # Ticket line with custom styling, data is set on each render
+        self.line, = self.ax.plot([], [], marker='o', color='darkorange', linestyle='-', linewidth=2, markersize=8,
+                                  zorder=1)
+
+        # Customize the appearance of the plot
+        ax = self.ax
+        ax.patch.set_facecolor((0, 0, 0, 0))  # Transparent background for axis
+        self.title = ax.set_title("", size=32, color='white', pad=20)
+        ax.tick_params(axis='x', colors='white', labelsize=18)
+        ax.spines['top'].set_visible(False)  # Hide top spine
+        ax.spines['right'].set_visible(False)  # Hide right spine
+        ax.spines['bottom'].set_color('white')  # Set bottom spine color
+        ax.spines['left'].set_visible(False)  # Hide left spine
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%m/%d'))  # Format x-axis labels as month/day
+        ax.xaxis.set_major_locator(mdates.DayLocator(interval=1))  # Set x-axis ticks at daily intervals
+        ax.set_aspect('auto')  # Adjust aspect ratio
+        ax.get_yaxis().set_visible(False)  # Hide y-axis labels
+        ax.xaxis.grid(True, linestyle=":", alpha=0.4)  # Configure grid lines for the x-axis
+        self.fig.subplots_adjust(left=0, right=1)  # Adjust subplot margins
+
+    def set_background(self, img_path: str):
+        if not os.path.exists(img_path):
+            return
+        img = load_background(img_path, *self.size)
+        if self.background is None:
+            self.background = self.fig.figimage(img, 0, 0, zorder=0, alpha=0.2)  # Overlay image with transparency
+        else:
+            self.background.set_data(img)
+
+    def render(self, df):
+        self.set_background(choice(RAID_PATH))
+        self.line.set_data(df['date'], df['tickets'])
+        self.title.set_text(f"{df['name'].iloc[0]} Tickets (Last 7 days)")
+
+        # Annotate data points with ticket numbers
+        for annotation in self.annotations:
+            annotation.remove()
+        self.annotations = [
+            self.ax.annotate(txt, (df['date'][i], df['tickets'][i]), textcoords="offset points", xytext=(0, 10),
+                             ha='center', color='white', fontsize=18, zorder=2)
+            for i, txt in enumerate(df['tickets'])
+        ]
+
+        # Set dynamic axis limits based on data
+        self.ax.relim()
+        self.ax.autoscale_view(scaley=False)
+        y_min = df['tickets'].min() - df['tickets'].min() * 0.1
+        y_max = df['tickets'].max() + df['tickets'].max() * 0.1
+        self.ax.set_ylim([y_min, y_max])
+
+        # tight_layout is the slowest step, so it only runs again when the tick labels or the title width change
+        layout_key = (len(df), len(self.title.get_text()))
+        if layout_key != self.layout_key:
+            self.fig.tight_layout()
+            self.layout_key = layout_key
+
+        # Render the plot into memory
+        buffer = BytesIO()
+        self.fig.savefig(buffer, format='png', pil_kwargs={'compress_level': PNG_COMPRESS_LEVEL})
+        buffer.seek(0)
+        return buffer
+
+
+_templates = threading.local()
+
+
+def get_report_template():
+    """Function that returns the ticket report template of the current thread, creating it on first use."""
+    if not hasattr(_templates, "ticket_report"):
+        _templates.ticket_report = TicketReportTemplate()
+    return _templates.ticket_report
+
+
+def render_ticket_report(df):
+    """
+    Function that renders the ticket report plot with the Agg backend and returns it as PNG bytes in a BytesIO.
+    Each thread reuses its own figure template, so several reports can render at the same time.
+    """
+    return get_report_template().render(df)
@@ -1,145 +1,138 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
+import asyncio
 import os
-from random import choice
-import numpy as np
-from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+import db_async
 import discord
 from logger import setup_logging
 
+# pandas and the chart renderer (bot_render: matplotlib, numpy, PIL) are imported on first use to keep the
+# bot's startup fast
 load_dotenv()
 logger = setup_logging()
 
 CHANNEL_ID = int(os.getenv("CHANNEL_ID"))
-FILE = "./data/tickets.png"  # Path for saving the plot
-RAID_PATH = ["./data/naboo.png"]  # Path for the background image used in the plot
-
-def plot_ticket_report(guild_id: str):
+RENDER_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("RENDER_WORKERS", "4")), thread_name_prefix="render")
+
+# SQL query to retrieve ticket data for the past 7 days for the given guild, from the daily rollup
+TICKET_REPORT_QUERY = """
+    select
+        agg.date,
+        sum(agg.tickets) as tickets,
+        dg."name"
+    from agg_swgoh_tickets_daily agg
+    join d_swgoh_guild dg on agg.sk_guild = dg.id
+    where 1=1
+        and agg.date > current_date - 7
+        and dg.guild_id = $1
+    group by agg.date, dg."name"
+"""
+
+# SQL query to fetch missed tickets for players in the guild over the specified number of days, from the daily rollup
+TICKETS_MISSED_QUERY = """
+    select
+        dp.name as player,
+        sum(agg.tickets_missed) as tickets_missed
+    from agg_swgoh_tickets_daily agg
+    join d_swgoh_player dp on dp.id = agg.sk_player
+    join d_swgoh_guild dg on dg.id = agg.sk_guild
+    where 1=1
+        and agg.tickets_missed > 0
+        and dg.guild_id = $1
+        and agg.date >= CURRENT_DATE - make_interval(days => $2::int)
+    group by dp.name
+    order by 2 desc
+"""
+
+# SQL query to list the guilds known to the ETL, used to resolve the guild argument of the bot commands
+GUILDS_QUERY = """
+    select guild_id, "name"
+    from d_swgoh_guild
+"""
+
+
+async def get_guilds():
     """
-    Function that generates a ticket report plot for the specified guild_id.
-    Connects to the database, fetches ticket data, plots it, and saves the plot as an image.
-    """
-    DATABASE_URL = os.getenv('DATABASE_URL')
-    logger.info(f"Attempting to connect to the database at {DATABASE_URL}")
-    engine = create_engine(DATABASE_URL)
-
-    # SQL query to retrieve ticket data for the past 7 days for the given guild
-    query = f"""
-        select
-            cast(dt."date" as date) as date,
-            sum(tickets) as tickets,
-            dg."name" 
-        from f_swgoh_tickets ft
-        join d_time dt on ft.sk_time = dt.id
-        join d_swgoh_guild dg on ft.sk_guild = dg.id
-        where 1=1
-            and dt."date" > current_date - 7
-            and dg.guild_id = '{guild_id}' 
-        group by dt."date", dg."name" 
+    Function that returns a dict of guild_id -> guild name for the guilds loaded by the ETL.
     """
+    rows = await db_async.fetch(GUILDS_QUERY)
+    return {row["guild_id"]: row["name"] for row in rows}
 
+
+async def get_ticket_report_data(guild_id: str):
+    """
+    Function that fetches the ticket totals of the last 7 days for the specified guild_id.
+    Returns None if the query fails.
+    """
     try:
         logger.info(f"Running query to fetch ticket data for guild {guild_id}")
-        with engine.connect() as conn:
-            df = pd.read_sql_query(query, conn)
+        df = await db_async.fetch_df(TICKET_REPORT_QUERY, guild_id)
         logger.info(f"Data fetched successfully for guild {guild_id}")
     except Exception as e:
         logger.error(f"Error occurred while fetching data: {e}")
-        return
+        return None
+
+    import pandas as pd
 
     # Convert 'date' column to datetime and sort DataFrame by date
     df['date'] = pd.to_datetime(df['date'])
-    df = df.sort_values(by='date', ascending=True).reset_index(drop=True)
+    return df.sort_values(by='date', ascending=True).reset_index(drop=True)
+
+
+def render_ticket_report(df):
+    """
+    Function that renders the ticket report PNG into a BytesIO, importing the renderer on first use.
+    Runs on RENDER_EXECUTOR.
+    """
+    from bot_render import render_ticket_report as render
+    return render(df)
+
+
+def warm_up_renderer():
+    """
+    Function that imports the chart renderer on the render pool in the background, so the first report
+    does not pay for it. Called once the bot is connected.
+    """
+    RENDER_EXECUTOR.submit(__import__, "bot_render")
+
+
+async def plot_ticket_report(guild_id: str):
+    """
+    Function that generates a ticket report plot for the specified guild_id.
+    Fetches ticket data through the async pool, renders it on the render pool so the Discord event loop is not
+    blocked, and returns the PNG in a BytesIO, or None if there is no data.
+    """
+    df = await get_ticket_report_data(guild_id)
+    if df is None or df.empty:
+        logger.warning(f"No ticket data to plot for guild {guild_id}")
+        return None
 
-    # Setup for the plot
     logger.info(f"Creating ticket report plot for guild {guild_id}")
-    plt.rcParams['figure.facecolor'] = '#333333'  # Set figure background color
-    plt.rcParams['text.color'] = 'white'  # Set text color
-    plt.rcParams['font.size'] = 18  # Set font size
-
-    fig, ax = plt.subplots(figsize=(10, 8))  # Create figure and axis
-
-    # Add a background image to the plot if the path exists
-    img_path = choice(RAID_PATH)
-    if os.path.exists(img_path):
-        logger.info(f"Using background image: {img_path}")
-        img = np.array(Image.open(img_path).resize(
-            (int(fig.get_size_inches()[0] * fig.dpi), int(fig.get_size_inches()[1] * fig.dpi)), Image.LANCZOS))
-        fig.figimage(img, 0, 0, zorder=0, alpha=0.2)  # Overlay image with transparency
-
-    # Plot ticket data with custom styling
-    ax.plot(df['date'], df['tickets'], marker='o', color='darkorange', linestyle='-', linewidth=2, markersize=8,
-            zorder=1)
-
-    # Customize the appearance of the plot
-    ax.patch.set_facecolor((0, 0, 0, 0))  # Transparent background for axis
-    ax.set_title(f"{df['name'].iloc[0]} Tickets (Last 7 days)", size=32, color='white', pad=20)
-    ax.tick_params(axis='x', colors='white', labelsize=18)
-    ax.spines['top'].set_visible(False)  # Hide top spine
-    ax.spines['right'].set_visible(False)  # Hide right spine
-    ax.spines['bottom'].set_color('white')  # Set bottom spine color
-    ax.spines['left'].set_visible(False)  # Hide left spine
-    ax.xaxis.set_major_formatter(mdates.DateFormatter('%m/%d'))  # Format x-axis labels as month/day
-    ax.xaxis.set_major_locator(mdates.DayLocator(interval=1))  # Set x-axis ticks at daily intervals
-
-    # Annotate data points with ticket numbers
-    for i, txt in enumerate(df['tickets']):
-        ax.annotate(txt, (df['date'][i], df['tickets'][i]), textcoords="offset points", xytext=(0, 10), ha='center',
-                    color='white', zorder=2)
-
-    # Set dynamic y-axis limits based on data
-    y_min = df['tickets'].min() - df['tickets'].min() * 0.1
-    y_max = df['tickets'].max() + df['tickets'].max() * 0.1
-    ax.set_aspect('auto')  # Adjust aspect ratio
-    ax.set_ylim([y_min, y_max])
-    ax.get_yaxis().set_visible(False)  # Hide y-axis labels
-
-    # Configure grid lines for the x-axis
-    ax.xaxis.grid(True, linestyle=":", alpha=0.4)
-
-    # Save the plot to a file
-    logger.info(f"Saving plot to {FILE}")
-    plt.subplots_adjust(left=0, right=1)  # Adjust subplot margins
-    plt.tight_layout()
-    plt.savefig(FILE)  # Save the plot
-    logger.info(f"Plot saved successfully to {FILE}")
-
-def get_tickets_missed(guild_id: str, days: str):
+    loop = asyncio.get_running_loop()
+    buffer = await loop.run_in_executor(RENDER_EXECUTOR, render_ticket_report, df)
+    logger.info(f"Plot rendered successfully for guild {guild_id}")
+    return buffer
+
+
+async def query_tickets_missed(guild_id: str, days: str):
     """
-    Function that retrieves data on missed tickets for the given guild and time period.
+    Function that queries missed tickets for the given guild and time period, raising on database errors.
     """
-    DATABASE_URL = os.getenv('DATABASE_URL')  # Database connection URL
-    logger.info(f"Attempting to connect to the database at {DATABASE_URL}")
-    engine = create_engine(DATABASE_URL)  # Create a connection to the database
-
-    # SQL query to fetch missed tickets for players in the guild over the specified number of days
-    query = f"""
-                select
-                    dp.name as player,
-                    sum(600 - tickets) as tickets_missed
-                from f_swgoh_tickets ft
-                join d_time dt on dt.id = ft.sk_time
-                join d_swgoh_player dp on dp.id = ft.sk_player
-                join d_swgoh_guild dg on dg.id = ft.sk_guild
-                where 1=1
-                    and ft.tickets < 600
-                    and dg.guild_id = '{guild_id}'
-                    and dt.date >= CURRENT_DATE - interval '{days} days'
-                group by dp.name
-                order by 2 desc
-                """
+    logger.info(f"Running query to fetch missed tickets data for guild {guild_id} over the last {days} days")
+    df = await db_async.fetch_df(TICKETS_MISSED_QUERY, guild_id, int(days))
+    logger.info(f"Missed tickets data fetched successfully for guild {guild_id}")
+    return df
 
-    try:
-        logger.info(f"Running query to fetch missed tickets data for guild {guild_id} over the last {days} days")
-        with engine.connect() as conn:
-            df = pd.read_sql_query(query, conn)
 
-        logger.info(f"Missed tickets data fetched successfully for guild {guild_id}")
+async def get_tickets_missed(guild_id: str, days: str):
+    """
+    Function that retrieves data on missed tickets for the given guild and time period.
+    """
+    try:
+        df = await query_tickets_missed(guild_id, days)
     except Exception as e:
         logger.error(f"Error occurred while fetching missed tickets data: {e}")
+        import pandas as pd
         return pd.DataFrame()  # Return an empty DataFrame in case of error
 
     return df  # Return the DataFrame with the missed tickets data
@@ -0,0 +1,52 @@
+import io
+
+import pandas as pd
+from psycopg2 import sql
+from sqlalchemy import inspect, text
+
+COPY_CHUNK_ROWS = 50_000
+NULL_MARKER = "\\N"
+
+
+def copy_dataframe(connection, df: pd.DataFrame, table_name: str, truncate: bool = True,
+                   chunk_rows: int = COPY_CHUNK_ROWS, temporary: bool = False):
+    """
+    Load a DataFrame into a persistent table with COPY FROM STDIN.
+    Runs inside the transaction of the given SQLAlchemy connection: the table is created from the
+    DataFrame columns on first use, truncated when truncate=True, and rows are streamed in CSV chunks.
+    With temporary=True the rows go to a temporary copy of the table dropped at commit, which shadows it for
+    the rest of the transaction, so concurrent transactions can stage into the same table without waiting.
+    Returns the number of rows copied.
+    """
+    inspector = inspect(connection)
+    if not inspector.has_table(table_name):
+        df.head(0).to_sql(table_name, con=connection, index=False)
+
+    if temporary:
+        connection.execute(text(f'CREATE TEMP TABLE IF NOT EXISTS "{table_name}" '
+                                f'(LIKE "{inspector.default_schema_name}"."{table_name}" INCLUDING DEFAULTS) '
+                                f'ON COMMIT DROP'))
+
+    if truncate:
+        connection.execute(text(f'TRUNCATE TABLE "{table_name}"'))
+
+    if df.empty:
+        return 0
+
+    cursor = connection.connection.cursor()
+    try:
+        statement = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL {})").format(
+            sql.Identifier(table_name),
+            sql.SQL(", ").join(sql.Identifier(str(column)) for column in df.columns),
+            sql.Literal(NULL_MARKER),
+        ).as_string(cursor)
+
+        for start in range(0, len(df), chunk_rows):
+            buffer = io.StringIO()
+            df.iloc[start:start + chunk_rows].to_csv(buffer, index=False, header=False, na_rep=NULL_MARKER)
+            buffer.seek(0)
+            cursor.copy_expert(statement, buffer)
+    finally:
+        cursor.close()
+
+    return len(df)
@@ -0,0 +1,161 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+from logger import setup_logging
+
+logger = setup_logging()
+load_dotenv()
+
+COMLINK_CACHE_DIR = os.getenv("COMLINK_CACHE_DIR", "./.comlink_cache")
+# refresh (default): always hit comlink and write the responses through to the cache, so a scheduled run never
+# loads stale tickets or members but leaves its payloads behind,
+# on: read-through cache with TTL, replay: serve only from the cache (no comlink container needed), ignoring TTLs,
+# off: always hit comlink without storing.
+# To rerun after a failed database step without hitting the network, run again with COMLINK_CACHE_MODE=replay
+# (or on, within the TTLs).
+COMLINK_CACHE_MODE = os.getenv("COMLINK_CACHE_MODE", "refresh")
+COMLINK_CACHE_MAX_BYTES = int(os.getenv("COMLINK_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+# Seconds a cached response stays valid, per endpoint
+DEFAULT_TTL = {
+    "get_guild": int(os.getenv("COMLINK_CACHE_TTL_GET_GUILD", "900")),
+    "get_player": int(os.getenv("COMLINK_CACHE_TTL_GET_PLAYER", "3600")),
+    "get_unit_stats": int(os.getenv("COMLINK_CACHE_TTL_GET_UNIT_STATS", "86400")),
+}
+MODES = ("on", "off", "refresh", "replay")
+
+
+class CacheMiss(LookupError):
+    """Raised in replay mode when a request is not in the local store."""
+
+
+class CachedComlink:
+    """
+    Disk cache in front of a SwgohComlink client.
+    get_guild, get_player and get_unit_stats responses are stored gzip-compressed, keyed by the request
+    parameters; the oldest entries are evicted once the store grows past max_bytes.
+    Any other attribute is delegated to the wrapped client.
+    """
+
+    def __init__(self, client, cache_dir: str = COMLINK_CACHE_DIR, mode: str = COMLINK_CACHE_MODE,
+                 ttl: dict = None, max_bytes: int = COMLINK_CACHE_MAX_BYTES):
+        if mode not in MODES:
+            raise ValueError(f"Invalid comlink cache mode '{mode}', expected one of {', '.join(MODES)}.")
+        self.client = client
+        self.cache_dir = cache_dir
+        self.mode = mode
+        self.ttl = {**DEFAULT_TTL, **(ttl or {})}
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size = None
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def get_guild(self, guild_id: str, include_recent_guild_activity_info: bool = False, **kwargs):
+        params = {"guild_id": guild_id, "include_recent_guild_activity_info": include_recent_guild_activity_info,
+                  **kwargs}
+        return self._cached("get_guild", params)
+
+    def get_player(self, allycode=None, player_id=None, **kwargs):
+        params = {"allycode": allycode, "player_id": player_id, **kwargs}
+        return self._cached("get_player", params)
+
+    def get_unit_stats(self, request_payload, flags: list = None, language: str = None):
+        params = {"request_payload": request_payload, "flags": flags, "language": language}
+        return self._cached("get_unit_stats", params)
+
+    def _cached(self, endpoint: str, params: dict):
+        path = self._path(endpoint, params)
+
+        if self.mode in ("on", "replay"):
+            response = self._read(path, endpoint)
+            if response is not None:
+                self.hits += 1
+                return response
+            if self.mode == "replay":
+                raise CacheMiss(f"No cached {endpoint} response for {params_summary(params)}.")
+
+        self.misses += 1
+        response = getattr(self.client, endpoint)(**{k: v for k, v in params.items() if v is not None})
+        if self.mode != "off" and not is_error_response(response):
+            self._write(path, response)
+        return response
+
+    def _path(self, endpoint: str, params: dict):
+        key = hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+        return os.path.join(self.cache_dir, endpoint, f"{key}.json.gz")
+
+    def _read(self, path: str, endpoint: str):
+        try:
+            age = time.time() - os.path.getmtime(path)
+            if self.mode != "replay" and age > self.ttl[endpoint]:
+                return None
+            with gzip.open(path, "rt", encoding="utf-8") as file:
+                response = json.load(file)
+            os.utime(path, (time.time(), os.path.getmtime(path)))
+            return response
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable comlink cache entry {path}: {e}")
+            return None
+
+    def _write(self, path: str, response):
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as file:
+                json.dump(response, file, separators=(",", ":"))
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+            with self._lock:
+                if self._size is None:
+                    self._size = self._scan_size()
+                else:
+                    self._size += size
+                if self._size > self.max_bytes:
+                    self._evict()
+        except Exception as e:
+            logger.warning(f"Could not write comlink cache entry {path}: {e}")
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".json.gz"):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    yield stat.st_atime, stat.st_size, path
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Delete least recently read entries until the store is back under 90% of max_bytes."""
+        target = self.max_bytes * 0.9
+        removed = 0
+        for _, size, path in sorted(self._entries()):
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+                self._size -= size
+                removed += 1
+            except FileNotFoundError:
+                pass
+        logger.info(f"Evicted {removed} comlink cache entries, store is now {self._size / 1024 / 1024:.1f} MB.")
+
+
+def is_error_response(response):
+    return isinstance(response, dict) and "code" in response and "message" in response
+
+
+def params_summary(params: dict):
+    return ", ".join(f"{k}={v}" for k, v in params.items() if v is not None and k != "request_payload")
@@ -0,0 +1,52 @@
+import os
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds
+DB_PRE_PING = os.getenv("DB_PRE_PING", "true").lower() in ("1", "true", "yes")
+ETL_NOTIFY_CHANNEL = os.getenv("ETL_NOTIFY_CHANNEL", "hunter_etl")
+
+# sqlalchemy is imported when the engine is first created, so importing this module stays cheap
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """
+    Process-wide SQLAlchemy engine, created on first use.
+    Every module shares its connection pool (DB_POOL_SIZE + DB_MAX_OVERFLOW connections, pre-ping on checkout).
+    Recurring queries should be module-level text() constants with bound parameters so their compiled
+    form is reused from the engine's statement cache.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            from sqlalchemy import create_engine
+            _engine = create_engine(
+                os.getenv('DATABASE_URL'),
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_recycle=DB_POOL_RECYCLE,
+                pool_pre_ping=DB_PRE_PING,
+            )
+        return _engine
+
+
+def dispose_engine():
+    """Close the pooled connections, e.g. after forking a worker process."""
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+
+
+def notify_etl_complete(connection, guild_id: str):
+    """Queue a NOTIFY with the guild id on ETL_NOTIFY_CHANNEL; Postgres delivers it when the transaction commits."""
+    from sqlalchemy import text
+    connection.execute(text("select pg_notify(:channel, :guild_id)"), {"channel": ETL_NOTIFY_CHANNEL, "guild_id": guild_id})
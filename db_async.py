@@ -0,0 +1,107 @@
+import asyncio
+import os
+import re
+
+import asyncpg
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DB_ASYNC_MIN_SIZE = int(os.getenv("DB_ASYNC_MIN_SIZE", "1"))
+DB_ASYNC_MAX_SIZE = int(os.getenv("DB_ASYNC_MAX_SIZE", "5"))
+DB_ASYNC_TIMEOUT = float(os.getenv("DB_ASYNC_TIMEOUT", "30"))  # seconds per query
+
+_pool = None
+_pool_lock = None
+
+
+def get_dsn():
+    """DATABASE_URL without the SQLAlchemy driver suffix (postgresql+psycopg2:// -> postgresql://)."""
+    return re.sub(r"^postgres(ql)?(\+\w+)?://", "postgresql://", os.getenv("DATABASE_URL"))
+
+
+async def get_pool():
+    """asyncpg pool for the bot's event loop, created on first use."""
+    global _pool, _pool_lock
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await asyncpg.create_pool(
+                get_dsn(),
+                min_size=DB_ASYNC_MIN_SIZE,
+                max_size=DB_ASYNC_MAX_SIZE,
+                command_timeout=DB_ASYNC_TIMEOUT,
+            )
+        return _pool
+
+
+async def fetch(query: str, *args):
+    """Run a query and return its rows as asyncpg Records."""
+    pool = await get_pool()
+    async with pool.acquire() as connection:
+        return await connection.fetch(query, *args)
+
+
+async def fetch_df(query: str, *args):
+    """Run a query and return its rows as a DataFrame."""
+    import pandas as pd
+
+    pool = await get_pool()
+    async with pool.acquire() as connection:
+        statement = await connection.prepare(query)
+        columns = [attribute.name for attribute in statement.get_attributes()]
+        rows = await statement.fetch(*args)
+    return pd.DataFrame([tuple(row) for row in rows], columns=columns)
+
+
+async def execute(query: str, *args):
+    pool = await get_pool()
+    async with pool.acquire() as connection:
+        return await connection.execute(query, *args)
+
+
+async def copy_records(table_name: str, records: list, columns: list, truncate: bool = True):
+    """
+    Load records (tuples in column order) into a persistent staging table with COPY, in one transaction.
+    Returns the number of rows copied.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as connection:
+        async with connection.transaction():
+            if truncate:
+                await connection.execute(f'TRUNCATE TABLE "{table_name}"')
+            if records:
+                await connection.copy_records_to_table(table_name, records=records, columns=columns)
+    return len(records)
+
+
+async def copy_dicts(table_name: str, rows: list, truncate: bool = True):
+    """copy_records for a list of dicts sharing the same keys, which become the column list."""
+    columns = list(rows[0]) if rows else []
+    return await copy_records(table_name, [tuple(row.values()) for row in rows], columns, truncate=truncate)
+
+
+async def load_staging(table_name: str, rows: list, statements: list):
+    """
+    Replace a staging table's content with rows (dicts sharing the same keys) and run statements, each a
+    (query, *args) tuple, in the same transaction. The TRUNCATE lock serializes concurrent callers until commit.
+    """
+    columns = list(rows[0]) if rows else []
+    pool = await get_pool()
+    async with pool.acquire() as connection:
+        async with connection.transaction():
+            await connection.execute(f'TRUNCATE TABLE "{table_name}"')
+            if rows:
+                await connection.copy_records_to_table(table_name, records=[tuple(row.values()) for row in rows],
+                                                       columns=columns)
+            for query, *args in statements:
+                await connection.execute(query, *args)
+    return len(rows)
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
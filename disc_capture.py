@@ -0,0 +1,439 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import discord
+from dotenv import load_dotenv
+
+import db_async
+from logger import setup_logging
+
+load_dotenv()
+logger = setup_logging()
+
+CAPTURE_GUILD_ID = int(os.getenv("CAPTURE_GUILD_ID", "1193323906015187044"))  # Discord server whose events are stored
+CAPTURE_FLUSH_INTERVAL = float(os.getenv("CAPTURE_FLUSH_INTERVAL", "60"))  # seconds between flushes
+CAPTURE_BATCH_SIZE = int(os.getenv("CAPTURE_BATCH_SIZE", "500"))  # buffered messages that trigger an early flush
+CAPTURE_BUFFER_MAX = int(os.getenv("CAPTURE_BUFFER_MAX", "50000"))  # buffered messages or edits kept at most
+MESSAGE_CHUNK_ROWS = int(os.getenv("MESSAGE_CHUNK_ROWS", "1000"))
+MESSAGE_FETCH_CONCURRENCY = int(os.getenv("MESSAGE_FETCH_CONCURRENCY", "4"))
+DISC_STATE_PATH = os.getenv("DISC_STATE_PATH", "./disc_state.json")  # fingerprints of the stored channels/members
+
+WATERMARKS_QUERY = "select channel_id, last_message_id from disc_channel_watermarks"
+# Staging table, key, insert and merge procedures of each entity kind. Changed rows go through both procedures,
+# tombstones (rows with only the key and removed_at) only through the merge into disc_*_state
+ENTITY_STAGING = {
+    "channels": ("stg_disc_channels", "channel_id", "insert_discord_channels", "merge_discord_channels"),
+    "members": ("stg_disc_members", "member_id", "insert_discord_members", "merge_discord_members"),
+}
+UPSERT_WATERMARK_QUERY = """
+    insert into disc_channel_watermarks (channel_id, channel_name, last_message_id, updated_at)
+    values ($1, $2, $3, now())
+    on conflict (channel_id) do update
+        set channel_name = excluded.channel_name,
+            last_message_id = greatest(disc_channel_watermarks.last_message_id, excluded.last_message_id),
+            updated_at = excluded.updated_at
+"""
+
+
+def channel_row(channel):
+    """Function that builds the 'stg_disc_channels' row of a channel."""
+    return {
+        'channel_id': channel.id,
+        'channel_name': channel.name,
+        'channel_type': str(channel.type),
+        'topic': channel.topic if isinstance(channel, discord.TextChannel) else None,
+        'nsfw': channel.nsfw if isinstance(channel, discord.TextChannel) else None,
+        'user_limit': channel.user_limit if isinstance(channel, discord.VoiceChannel) else None,
+        'bitrate': channel.bitrate if isinstance(channel, discord.VoiceChannel) else None,
+        'category': channel.name if isinstance(channel, discord.CategoryChannel) else None
+    }
+
+
+def member_row(member):
+    """Function that builds the 'stg_disc_members' row of a member."""
+    return {
+        'member_id': member.id,
+        'username': member.name,
+        'display_name': member.display_name,
+        'joined_at': member.joined_at,
+    }
+
+
+def message_row(guild, msg):
+    """Function that builds the 'stg_disc_messages' row of a message."""
+    member = guild.get_member(msg.author.id)
+    nickname = member.nick if member and member.nick else msg.author.name
+    return {
+        "message_id": msg.id,
+        "channel": msg.channel.name,
+        "user_id": msg.author.id,
+        "user_name": msg.author.name,
+        "nickname": nickname,
+        "message_content": msg.content,
+        "timestamp": msg.created_at,
+        "edited_at": msg.edited_at
+    }
+
+
+def edited_message_row(guild, payload):
+    """
+    Function that builds the 'stg_disc_messages' row of an edited message from the raw gateway payload,
+    so edits of messages that are not in the bot's cache are captured too.
+    Returns None for updates that are not edits (e.g. link embeds being resolved).
+    """
+    data = payload.data
+    author = data.get("author")
+    if not author or "content" not in data or not data.get("edited_timestamp"):
+        return None
+    channel = guild.get_channel(payload.channel_id)
+    member = guild.get_member(int(author["id"]))
+    return {
+        "message_id": payload.message_id,
+        "channel": channel.name if channel else None,
+        "user_id": int(author["id"]),
+        "user_name": author["username"],
+        "nickname": member.nick if member and member.nick else author["username"],
+        "message_content": data["content"],
+        "timestamp": discord.utils.snowflake_time(payload.message_id),
+        "edited_at": discord.utils.parse_time(data["edited_timestamp"])
+    }
+
+
+class FingerprintStore:
+    """
+    Hash of the last stored row of each channel and member, kept in a local JSON file, so only new or
+    changed entities are staged and merged.
+    """
+
+    def __init__(self, path: str = DISC_STATE_PATH):
+        self.path = path
+        self.fingerprints = {"channels": {}, "members": {}}
+        try:
+            with open(path, encoding="utf-8") as file:
+                self.fingerprints.update(json.load(file))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read {path}, every channel and member will be stored again: {e}")
+
+    @staticmethod
+    def fingerprint(row: dict):
+        return hashlib.sha1(json.dumps(row, sort_keys=True, default=str).encode()).hexdigest()
+
+    def changed(self, kind: str, rows: list, key: str):
+        """Rows that are new or differ from their stored fingerprint."""
+        stored = self.fingerprints[kind]
+        return [row for row in rows if stored.get(str(row[key])) != self.fingerprint(row)]
+
+    def commit(self, kind: str, rows: list, key: str):
+        """Record the rows as stored (call save() to persist)."""
+        for row in rows:
+            self.fingerprints[kind][str(row[key])] = self.fingerprint(row)
+
+    def removed(self, kind: str, present_ids):
+        """Stored ids that are no longer present."""
+        return set(self.fingerprints[kind]) - {str(entity_id) for entity_id in present_ids}
+
+    def forget(self, kind: str, ids):
+        for entity_id in ids:
+            self.fingerprints[kind].pop(str(entity_id), None)
+
+    async def save(self):
+        """Write the file from a worker thread; the snapshot is serialized first, on the event loop."""
+        await asyncio.to_thread(self._write, json.dumps(self.fingerprints))
+
+    def _write(self, data: str):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write(data)
+        os.replace(temp_path, self.path)
+
+
+class DiscordCapture:
+    """
+    Captures messages, message edits, member and channel changes of one Discord server as gateway events arrive,
+    buffers them in memory and flushes them to the stg_disc_* tables and insert_discord_* procedures every
+    CAPTURE_FLUSH_INTERVAL seconds, or earlier when CAPTURE_BATCH_SIZE messages are waiting. Messages and edits
+    are also upserted on their message id by upsert_discord_messages.
+
+    Channels and members are only staged when their fingerprint (FingerprintStore) changed. Removed ones are
+    staged as tombstones (key and removed_at only), which merge_discord_* flags as inactive in disc_*_state.
+    On every (re)connection a backfill diffs the full channel/member list and reads each channel's history
+    after its watermark, covering the time the bot was offline. Captured messages are held until the backfill
+    succeeds and are then stored only if they are newer than the channel watermark, so nothing is stored twice.
+    When more than CAPTURE_BUFFER_MAX messages are waiting (e.g. the backfill keeps failing), they are dropped and
+    read again from the channel history by the next backfill.
+    """
+
+    def __init__(self, bot, guild_id: int = CAPTURE_GUILD_ID, state: FingerprintStore = None):
+        self.bot = bot
+        self.guild_id = guild_id
+        self.state = state or FingerprintStore()
+        self.messages = []  # (channel_id, channel_name, message_id, row)
+        self.edits = {}  # message_id -> row of the latest edit
+        self.channels = {}  # channel_id -> row
+        self.members = {}  # member_id -> row
+        self.removed = {"channels": {}, "members": {}}  # kind -> {id: removed_at}
+        self.watermarks = {}  # channel_id -> last stored message id
+        self._lock = asyncio.Lock()  # one flush or backfill at a time
+        self._wake = asyncio.Event()  # set to flush early or to run a backfill
+        self._ready = False
+        self._backfill_needed = True
+        self._overflows = 0  # times the message buffer was dropped
+        self._task = None
+
+    def register(self):
+        """Subscribe to the bot events."""
+        for name in ("on_message", "on_raw_message_edit", "on_member_join", "on_member_update", "on_member_remove",
+                     "on_guild_channel_create", "on_guild_channel_update", "on_guild_channel_delete"):
+            self.bot.add_listener(getattr(self, name), name)
+
+    def start(self):
+        """Start the flush loop, or schedule a new backfill if it is already running (reconnection)."""
+        self._backfill_needed = True
+        self._ready = False
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        else:
+            self._wake.set()
+
+    def _tracked(self, guild):
+        return guild is not None and guild.id == self.guild_id
+
+    async def on_message(self, msg):
+        if self._tracked(msg.guild) and isinstance(msg.channel, discord.TextChannel):
+            if len(self.messages) >= CAPTURE_BUFFER_MAX:
+                # Every buffered message is newer than its channel watermark, so a backfill reads it again
+                logger.warning(f"{len(self.messages)} captured messages waiting, dropping them for the next backfill.")
+                self.messages = []
+                self._overflows += 1
+                self._backfill_needed = True
+                self._ready = False
+                self._wake.set()
+            self.messages.append((msg.channel.id, msg.channel.name, msg.id, message_row(msg.guild, msg)))
+            if len(self.messages) >= CAPTURE_BATCH_SIZE and self._ready:
+                self._wake.set()
+
+    async def on_raw_message_edit(self, payload):
+        guild = self.bot.get_guild(payload.guild_id) if payload.guild_id else None
+        if not self._tracked(guild):
+            return
+        row = edited_message_row(guild, payload)
+        if row is None:
+            return
+        if len(self.edits) >= CAPTURE_BUFFER_MAX and payload.message_id not in self.edits:
+            dropped = next(iter(self.edits))
+            logger.warning(f"Edit buffer full, dropping the edit of message {dropped}.")
+            del self.edits[dropped]
+        self.edits[payload.message_id] = row
+
+    async def on_member_join(self, member):
+        if self._tracked(member.guild):
+            self.removed["members"].pop(member.id, None)
+            self.members[member.id] = member_row(member)
+
+    async def on_member_update(self, before, after):
+        if self._tracked(after.guild):
+            self.members[after.id] = member_row(after)
+
+    async def on_member_remove(self, member):
+        if self._tracked(member.guild):
+            self.members.pop(member.id, None)
+            self.removed["members"][member.id] = datetime.now(timezone.utc)
+            logger.info(f"Member {member.name} ({member.id}) left the server.")
+
+    async def on_guild_channel_create(self, channel):
+        if self._tracked(channel.guild):
+            self.channels[channel.id] = channel_row(channel)
+
+    async def on_guild_channel_update(self, before, after):
+        if self._tracked(after.guild):
+            self.channels[after.id] = channel_row(after)
+
+    async def on_guild_channel_delete(self, channel):
+        if self._tracked(channel.guild):
+            self.channels.pop(channel.id, None)
+            self.removed["channels"][channel.id] = datetime.now(timezone.utc)
+            logger.info(f"Channel {channel.name} ({channel.id}) was deleted.")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=CAPTURE_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                if self._backfill_needed:
+                    await self.backfill()
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing captured Discord events: {e}")
+
+    async def flush(self):
+        """Store the buffered channels, members, removals, message edits and (once backfilled) messages."""
+        async with self._lock:
+            channels, self.channels = self.channels, {}
+            members, self.members = self.members, {}
+            try:
+                stored_channels = await self._load_channels(list(channels.values()))
+            except Exception:
+                self.channels = {**channels, **self.channels}
+                raise
+            try:
+                stored_members = await self._load_members(list(members.values()))
+            except Exception:
+                self.members = {**members, **self.members}
+                raise
+            stored_removed = 0
+            for kind, pending in self.removed.items():
+                removed, self.removed[kind] = pending, {}
+                try:
+                    stored_removed += await self._load_removed(kind, removed)
+                except Exception:
+                    self.removed[kind] = {**removed, **self.removed[kind]}
+                    raise
+            edits, self.edits = self.edits, {}
+            try:
+                stored_edits = await self._load_edits(list(edits.values()))
+            except Exception:
+                self.edits = {**edits, **self.edits}
+                raise
+
+            new = []
+            if self._ready and self.messages:
+                captured, self.messages = self.messages, []
+                new = [message for message in captured if message[2] > self.watermarks.get(message[0], 0)]
+                try:
+                    await self._load_messages(new)
+                except Exception:
+                    self.messages = captured + self.messages
+                    raise
+            if stored_channels or stored_members or stored_removed or stored_edits or new:
+                logger.info(f"Flushed {stored_channels} channels, {stored_members} members, {stored_removed} removals, "
+                            f"{len(new)} messages and {stored_edits} edits.")
+
+    async def _load_entities(self, kind, rows):
+        """Stage and merge the channels or members whose fingerprint changed; returns how many."""
+        table, key, insert, merge = ENTITY_STAGING[kind]
+        rows = self.state.changed(kind, rows, key)
+        if rows:
+            await db_async.load_staging(table, rows, [(f"CALL {insert}()",), (f"CALL {merge}()",)])
+            self.state.commit(kind, rows, key)
+            await self.state.save()
+        return len(rows)
+
+    async def _load_channels(self, rows):
+        return await self._load_entities("channels", rows)
+
+    async def _load_members(self, rows):
+        return await self._load_entities("members", rows)
+
+    async def _load_removed(self, kind, removed):
+        """Stage tombstones of removed channels or members ({id: removed_at}) and merge them; returns how many."""
+        if not removed:
+            return 0
+        table, key, _, merge = ENTITY_STAGING[kind]
+        rows = [{key: int(entity_id), "removed_at": removed_at} for entity_id, removed_at in removed.items()]
+        await db_async.load_staging(table, rows, [(f"CALL {merge}()",)])
+        self.state.forget(kind, removed)
+        await self.state.save()
+        return len(rows)
+
+    async def _load_messages(self, messages):
+        """Load (channel_id, channel_name, message_id, row) tuples and move each channel's watermark."""
+        if not messages:
+            return 0
+        last_ids = {}
+        for channel_id, channel_name, message_id, _ in messages:
+            last_ids[channel_id] = (channel_name, max(message_id, last_ids.get(channel_id, (None, 0))[1]))
+        await db_async.load_staging('stg_disc_messages', [message[3] for message in messages], [
+            ("CALL insert_discord_messages()",),
+            ("CALL upsert_discord_messages()",),
+            *((UPSERT_WATERMARK_QUERY, channel_id, name, last_id) for channel_id, (name, last_id) in last_ids.items()),
+        ])
+        for channel_id, (_, last_id) in last_ids.items():
+            self.watermarks[channel_id] = max(last_id, self.watermarks.get(channel_id, 0))
+        return len(messages)
+
+    async def _load_edits(self, rows):
+        """Apply edited messages on their message id; returns how many."""
+        if rows:
+            await db_async.load_staging('stg_disc_messages', rows, [("CALL upsert_discord_messages()",)])
+        return len(rows)
+
+    async def backfill(self):
+        """
+        Store the new or changed channels and members and the history of every text channel after its watermark
+        (channels without one start at the beginning of the previous day).
+        """
+        async with self._lock:
+            guild = self.bot.get_guild(self.guild_id)
+            if guild is None:
+                logger.error("Guild not found!")
+                return
+            start_time = time.time()
+            overflows = self._overflows
+            logger.info(f"Backfilling server: {guild.name} (ID: {guild.id})")
+
+            channels = await self._load_channels([channel_row(channel) for channel in guild.channels])
+            members = await self._load_members([member_row(member) for member in guild.members])
+            logger.info(f"Stored {channels} new or changed channels and {members} new or changed members.")
+            for kind, present in (("channels", guild.channels), ("members", guild.members)):
+                removed = self.state.removed(kind, [entity.id for entity in present])
+                if removed:
+                    logger.info(f"{len(removed)} {kind} were removed from the server: {sorted(removed)}")
+                    await self._load_removed(kind, dict.fromkeys(removed, datetime.now(timezone.utc)))
+
+            rows = await db_async.fetch(WATERMARKS_QUERY)
+            for row in rows:
+                self.watermarks[row["channel_id"]] = max(row["last_message_id"], self.watermarks.get(row["channel_id"], 0))
+            d_minus_1 = datetime.now() - timedelta(days=1)
+            default_after = datetime(d_minus_1.year, d_minus_1.month, d_minus_1.day, 0, 0, 0)
+
+            semaphore = asyncio.Semaphore(MESSAGE_FETCH_CONCURRENCY)
+            results = await asyncio.gather(*(
+                self._backfill_channel(guild, channel, default_after, semaphore) for channel in guild.text_channels
+            ), return_exceptions=True)
+
+            failed = [channel.name for channel, result in zip(guild.text_channels, results)
+                      if isinstance(result, Exception)]
+            if failed:
+                # Captured messages stay held until every channel is caught up, otherwise the gap would be skipped
+                logger.error(f"Backfill failed for channels {failed}, retrying on the next flush.")
+            elif self._overflows != overflows:
+                logger.warning("Captured messages were dropped during the backfill, backfilling again.")
+            else:
+                self._backfill_needed = False
+                self._ready = True
+            logger.info(f"Backfill completed: {sum(r for r in results if isinstance(r, int))} messages in "
+                        f"{time.time() - start_time:.2f} seconds.")
+
+    async def _backfill_channel(self, guild, channel, default_after, semaphore):
+        """Stream a channel's history after its watermark (oldest first) in chunks of MESSAGE_CHUNK_ROWS."""
+        last_message_id = self.watermarks.get(channel.id)
+        after = discord.Object(id=last_message_id) if last_message_id else default_after
+        collected = 0
+        async with semaphore:
+            try:
+                chunk = []
+                async for msg in channel.history(after=after, limit=None, oldest_first=True):
+                    chunk.append((channel.id, channel.name, msg.id, message_row(guild, msg)))
+                    if len(chunk) >= MESSAGE_CHUNK_ROWS:
+                        collected += await self._load_messages(chunk)
+                        chunk = []
+                collected += await self._load_messages(chunk)
+            except Exception as e:
+                logger.error(f"Error reading messages from channel {channel.name}: {e}")
+                raise
+        if collected:
+            logger.info(f"Collected {collected} messages from channel: {channel.name}")
+        return collected
+
+    async def reconcile(self, bot, job):
+        """Job handler ('messages' report type) that runs a backfill on demand."""
+        await self.backfill()
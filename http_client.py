@@ -0,0 +1,222 @@
+import hashlib
+import hmac
+import os
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from json import dumps, loads
+from urllib.parse import urlsplit
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from swgoh_comlink import SwgohComlink
+
+load_dotenv()
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "4"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.5"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+HTTP_MAX_CONCURRENCY = int(os.getenv("HTTP_MAX_CONCURRENCY", "8"))
+HTTP_MAX_RATE = float(os.getenv("HTTP_MAX_RATE", "20"))  # requests per second, per host
+HTTP_MIN_RATE = float(os.getenv("HTTP_MIN_RATE", "0.5"))
+HTTP_TARGET_LATENCY = float(os.getenv("HTTP_TARGET_LATENCY", "2.0"))  # seconds, 0 to adapt on errors only
+# A swgoh-stats request computes a whole batch of rosters (STATS_BATCH_PLAYERS), so its latency says nothing
+# about the service health: by default only errors and 429s slow that endpoint down
+HTTP_STATS_TARGET_LATENCY = float(os.getenv("HTTP_STATS_TARGET_LATENCY", "0"))
+ENDPOINT_TARGET_LATENCY = {"api": HTTP_STATS_TARGET_LATENCY}  # comlink endpoint (without query) -> seconds
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RetryableStatus(requests.HTTPError):
+    """Raised for responses whose status code is worth retrying."""
+
+
+class UnexpectedPayload(RuntimeError):
+    """Raised by callers for a successful response whose payload is not usable; retried at the application level."""
+
+
+class AdaptiveLimiter:
+    """
+    Token bucket with a concurrency cap for one host.
+    The refill rate grows additively while requests are fast and succeed, and is halved on errors or
+    when latency goes above the target, so a struggling service gets less traffic. A target of 0 disables
+    the latency signal.
+    """
+
+    def __init__(self, max_rate: float = HTTP_MAX_RATE, min_rate: float = HTTP_MIN_RATE,
+                 max_concurrency: int = HTTP_MAX_CONCURRENCY, target_latency: float = HTTP_TARGET_LATENCY):
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.rate = max_rate
+        self.target_latency = target_latency
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def acquire(self):
+        """Block until a request may start; returns the seconds spent waiting."""
+        started = time.monotonic()
+        self._slots.acquire()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(max(self.rate, 1.0), self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return time.monotonic() - started
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def release(self, latency: float, ok: bool, target_latency: float = None):
+        """Free the slot and adapt the rate; target_latency overrides the limiter's target for this request."""
+        self._slots.release()
+        target = self.target_latency if target_latency is None else target_latency
+        with self._lock:
+            if not ok or (target and latency > target):
+                self.rate = max(self.min_rate, self.rate / 2)
+            else:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+
+class _HostStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.throttle_wait = 0.0
+        self.latencies = deque(maxlen=10_000)
+
+
+_session = None
+_session_lock = threading.Lock()
+_limiters = {}
+_stats = defaultdict(_HostStats)
+_state_lock = threading.Lock()
+
+
+def get_session():
+    """Process-wide requests session with keep-alive connection pools per host."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+
+def get_limiter(host: str):
+    with _state_lock:
+        if host not in _limiters:
+            _limiters[host] = AdaptiveLimiter()
+        return _limiters[host]
+
+
+def backoff_delay(attempt: int):
+    """Exponential backoff with full jitter for the given (1-based) attempt."""
+    return random.uniform(0, HTTP_BACKOFF * 2 ** attempt)
+
+
+def retry(func, *args, host: str = "app", retries: int = HTTP_RETRIES, retry_on: tuple = (Exception,), **kwargs):
+    """Call func, retrying with jittered exponential backoff on the retry_on exceptions."""
+    for attempt in range(1, retries + 1):
+        try:
+            return func(*args, **kwargs)
+        except retry_on:
+            if attempt == retries:
+                raise
+            with _state_lock:
+                _stats[host].retries += 1
+            time.sleep(backoff_delay(attempt))
+
+
+def request(method: str, url: str, retries: int = HTTP_RETRIES, target_latency: float = None, **kwargs):
+    """
+    Send an HTTP request through the shared session and the host's adaptive limiter.
+    Connection errors and retryable status codes are retried; the last response or error is returned/raised.
+    target_latency overrides the limiter's latency target (HTTP_TARGET_LATENCY) for this request.
+    """
+    host = urlsplit(url).netloc
+    limiter = get_limiter(host)
+    kwargs.setdefault("timeout", HTTP_TIMEOUT)
+
+    def send():
+        waited = limiter.acquire()
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = get_session().request(method, url, **kwargs)
+            ok = response.status_code not in RETRY_STATUSES
+            if not ok:
+                raise RetryableStatus(f"{method} {url} returned {response.status_code}", response=response)
+            return response
+        finally:
+            latency = time.perf_counter() - started
+            limiter.release(latency, ok, target_latency)
+            with _state_lock:
+                stats = _stats[host]
+                stats.requests += 1
+                stats.errors += not ok
+                stats.throttle_wait += waited
+                stats.latencies.append(latency)
+
+    try:
+        return retry(send, host=host, retries=retries)
+    except RetryableStatus as e:
+        return e.response
+
+
+def stats():
+    """Per-host counters: requests, errors, retries, throttle wait and p50/p95 latency in seconds."""
+    with _state_lock:
+        report = {}
+        for host, host_stats in _stats.items():
+            latencies = sorted(host_stats.latencies)
+            report[host] = {
+                "requests": host_stats.requests,
+                "errors": host_stats.errors,
+                "retries": host_stats.retries,
+                "throttle_wait": round(host_stats.throttle_wait, 3),
+                "p50": round(latencies[len(latencies) // 2], 3) if latencies else None,
+                "p95": round(latencies[int(len(latencies) * 0.95)], 3) if latencies else None,
+            }
+        return report
+
+
+def log_stats(logger):
+    for host, host_stats in stats().items():
+        logger.info(
+            f"Outbound requests to {host}: {host_stats['requests']} requests, {host_stats['errors']} errors, "
+            f"{host_stats['retries']} retries, p50 {host_stats['p50']}s, p95 {host_stats['p95']}s, "
+            f"throttled {host_stats['throttle_wait']}s."
+        )
+
+
+class PooledComlink(SwgohComlink):
+    """SwgohComlink client whose requests go through the shared session, limiter and retry policy."""
+
+    def _post(self, url_base: str = None, endpoint: str = None, payload: dict = None) -> dict:
+        if not url_base:
+            url_base = self.url_base
+        req_headers = {}
+        if self.hmac:
+            # Same request signature as SwgohComlink._post
+            req_time = str(int(time.time() * 1000))
+            req_headers = {"X-Date": req_time}
+            hmac_obj = hmac.new(key=self.secret_key.encode(), digestmod=hashlib.sha256)
+            hmac_obj.update(req_time.encode())
+            hmac_obj.update(b'POST')
+            hmac_obj.update(f'/{endpoint}'.encode())
+            payload_string = dumps(payload, separators=(',', ':')) if payload else dumps({})
+            hmac_obj.update(hashlib.md5(payload_string.encode()).hexdigest().encode())
+            req_headers['Authorization'] = f'HMAC-SHA256 Credential={self.access_key},Signature={hmac_obj.hexdigest()}'
+
+        response = request("POST", f"{url_base}/{endpoint}", json=payload, headers=req_headers, verify=False,
+                           target_latency=ENDPOINT_TARGET_LATENCY.get(endpoint.split("?")[0]))
+        return loads(response.content.decode('utf-8'))
@@ -1,8 +1,10 @@
-import requests
+import http_client
 import pandas as pd
-import os
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
+from db import get_engine
 from logger import setup_logging
+from bulk_load import copy_dataframe
+from migrate import migrate_if_enabled
 from dotenv import load_dotenv
 
 logger = setup_logging()
@@ -14,13 +16,13 @@ if __name__ == "__main__":
     try:
         logger.info("Script execution started.")
 
-        engine = create_engine(os.getenv('DATABASE_URL'))
-        logger.info("Database engine created successfully.")
+        engine = get_engine()
+        migrate_if_enabled(engine)
 
         with engine.begin() as connection:
             logger.info("Database connection established. Fetching data from API.")
 
-            response = requests.get(url)
+            response = http_client.request("GET", url)
             if response.status_code == 200:
                 logger.info("Data retrieved successfully from API.")
                 data = response.json()
@@ -45,9 +47,11 @@ if __name__ == "__main__":
                 raise Exception(f"API request failed with status code {response.status_code}")
 
             logger.info("Uploading data to the database table 'stg_unit'.")
-            df.to_sql("stg_swgoh_unit", con=connection, if_exists="replace", index=False)
+            copy_dataframe(connection, df, "stg_swgoh_unit")
             connection.execute(text("CALL insert_swgoh_units()"))
             logger.info("Data uploaded successfully to 'd_swgoh_unit'.")
 
     except Exception as e:
         logger.error(f"An error occurred during script execution: {e}")
+    finally:
+        http_client.log_stats(logger)
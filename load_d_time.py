@@ -1,7 +1,17 @@
 import pandas as pd
-from sqlalchemy import create_engine
-import os
-from dotenv import load_dotenv
+import numpy as np
+from sqlalchemy import inspect, text
+from db import get_engine
+from bulk_load import copy_dataframe
+from migrate import migrate_if_enabled
+import argparse
+from logger import setup_logging
+
+logger = setup_logging()
+
+# Períodos do dia: horas < 6 são 'night', [6, 12) 'morning', [12, 18) 'afternoon', [18, 21) 'evening', >= 21 'night'
+DAY_PERIOD_EDGES = [6, 12, 18, 21]
+DAY_PERIOD_LABELS = np.array(['night', 'morning', 'afternoon', 'evening', 'night'])
 
 
 def generate_date_range(start_date, end_date):
@@ -9,50 +19,66 @@ def generate_date_range(start_date, end_date):
     return dates
 
 
-def get_day_period(hour):
-    if 6 <= hour < 12:
-        return 'morning'
-    elif 12 <= hour < 18:
-        return 'afternoon'
-    elif 18 <= hour < 21:
-        return 'evening'
-    else:
-        return 'night'
+def get_day_period(hours):
+    return DAY_PERIOD_LABELS[np.searchsorted(DAY_PERIOD_EDGES, hours, side='right')]
 
 
 def create_dim_time_df(start_date, end_date):
     dates = generate_date_range(start_date, end_date)
-
-    # Gerar o id como um inteiro no formato YYYYMMDDHH
-    ids = [int(date.strftime('%Y%m%d') + f'{date.hour:02d}') for date in dates]
+    day_names = dates.day_name()
 
     data = {
-        'id': ids,  # Usando o novo formato de id
+        # id inteiro no formato YYYYMMDDHH
+        'id': (dates.year * 1000000 + dates.month * 10000 + dates.day * 100 + dates.hour).astype('int64'),
         'date': dates,
         'year': dates.year,
         'quarter': dates.quarter,
         'month': dates.month,
         'day_of_month': dates.day,
-        'abbr_day_name': dates.strftime('%a'),
-        'day_name': dates.strftime('%A'),
+        'abbr_day_name': day_names.str[:3],
+        'day_name': day_names,
         'day_of_week': dates.weekday + 1,  # Para garantir que a semana comece em 1 (segunda-feira)
         'is_weekend': dates.weekday >= 5,  # Fim de semana é sábado e domingo
         'hour_of_day': dates.hour,  # Horário da hora (0-23)
-        'day_period': [get_day_period(hour) for hour in dates.hour]  # Período do dia
+        'day_period': get_day_period(dates.hour)  # Período do dia
     }
 
     df = pd.DataFrame(data)
     return df
 
 
-def save_to_postgres(df, table_name):
-    load_dotenv()
-    database_url = os.getenv('DATABASE_URL')
-    engine = create_engine(database_url)
-    df.to_sql(table_name, engine, if_exists='replace', index=False)
+def get_next_start(connection, table_name, default_start):
+    """Return the hour after the current max id of the table, or default_start when it is empty or missing."""
+    if not inspect(connection).has_table(table_name):
+        return pd.Timestamp(default_start)
+    max_id = connection.execute(text(f'select max(id) from "{table_name}" where id > 0')).scalar()
+    if max_id is None:
+        return pd.Timestamp(default_start)
+    return pd.to_datetime(str(max_id), format='%Y%m%d%H') + pd.Timedelta(hours=1)
+
+
+def save_to_postgres(table_name, start_date, end_date):
+    """Append only the hours missing between the current max id and end_date."""
+    engine = get_engine()
+
+    with engine.begin() as connection:
+        start = get_next_start(connection, table_name, start_date)
+        if start > pd.Timestamp(end_date):
+            logger.info(f"{table_name} already covers up to {end_date}.")
+            return 0
+        df = create_dim_time_df(start, end_date)
+        rows = copy_dataframe(connection, df, table_name, truncate=False)
+    logger.info(f"Appended {rows} hours to {table_name} ({start} to {end_date}).")
+    return rows
+
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time dimension generation")
+    parser.add_argument('--table', default='d_time2')
+    parser.add_argument('--start', default='2024-01-01', help="First hour when the table is empty.")
+    parser.add_argument('--end', default=f"{pd.Timestamp.now().year + 1}-12-31 23:00",
+                        help="Last hour to generate (defaults to the end of next year).")
+    args = parser.parse_args()
 
-start_date = '2024-01-01'
-end_date = '2026-12-31'
-dim_time_df = create_dim_time_df(start_date, end_date)
-save_to_postgres(dim_time_df, 'd_time2')
+    migrate_if_enabled()
+    save_to_postgres(args.table, args.start, args.end)
@@ -1,14 +1,17 @@
-from sqlalchemy import create_engine
-from swgoh_comlink import SwgohComlink
+from db import get_engine
+from http_client import PooledComlink
+import http_client
+from comlink_cache import CachedComlink
 from dotenv import load_dotenv
 from logger import setup_logging
+from bulk_load import copy_dataframe
+from migrate import migrate_if_enabled
 from datetime import datetime, timezone
-import os
 import pandas as pd
 
 logger = setup_logging()
 load_dotenv()
-comlink = SwgohComlink()
+comlink = CachedComlink(PooledComlink())
 
 
 def get_guild_meta(guild_ids: list):
@@ -60,8 +63,8 @@ def get_guild_meta(guild_ids: list):
 if __name__ == "__main__":
     try:
         logger.info("Script execution started.")
-        engine = create_engine(os.getenv('DATABASE_URL'))
-        logger.info("Database engine created successfully.")
+        engine = get_engine()
+        migrate_if_enabled(engine)
 
         with engine.begin() as connection:
             logger.info("Database connection established. Processing guild data.")
@@ -69,7 +72,9 @@ if __name__ == "__main__":
             df = get_guild_meta(guild_ids=["iO-khl_0TVu64OussT1Y7g", "1HE3bh3LRcWVOto5KuGvzQ"])
             logger.info("Uploading guild data to the database.")
             # Upload the processed DataFrame to the database table `stg_swgoh_ss_guild`
-            df.to_sql("f_swgoh_ss_guild", con=connection, if_exists="append", index=False)
+            copy_dataframe(connection, df, "f_swgoh_ss_guild", truncate=False)
             logger.info("Data successfully inserted into the database.")
     except Exception as e:
         logger.error(f"An error occurred during script execution: {e}")
+    finally:
+        http_client.log_stats(logger)
@@ -1,9 +1,17 @@
-from sqlalchemy import create_engine, text
-from swgoh_comlink import SwgohComlink
+from sqlalchemy import text
+from db import get_engine
+from http_client import PooledComlink
+import http_client
+from comlink_cache import CachedComlink, is_error_response
 from dotenv import load_dotenv
 from logger import setup_logging
+from bulk_load import copy_dataframe
+from migrate import migrate_if_enabled
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
+import time
+import argparse
 import pandas as pd
 
 CSV_FILENAME = 'subs_data.csv'
@@ -11,80 +19,232 @@ CSV_FILENAME = 'subs_data.csv'
 
 logger = setup_logging()
 load_dotenv()
-comlink = SwgohComlink()
+comlink = CachedComlink(PooledComlink())
+UNIT_CHUNK_ROWS = 20_000
+ROSTER_FETCH_WORKERS = int(os.getenv("ROSTER_FETCH_WORKERS", "8"))
+STATS_WORKERS = int(os.getenv("STATS_WORKERS", "2"))
+STATS_BATCH_PLAYERS = int(os.getenv("STATS_BATCH_PLAYERS", "10"))
+# Attempts for unexpected payloads (http_client.UnexpectedPayload) only; transport errors and error responses
+# were already retried by http_client.request and propagate as they are
+APP_RETRIES = 2
+SNAPSHOT_PROCEDURES = {
+    "full": "insert_swgoh_ss_player",
+    "delta": "insert_swgoh_ss_player_delta",
+}
+
+
+def _units_frame(player_ids: list, units: list, snapshot_date: str):
+    """Build the tracking columns for a chunk of units with vectorized column operations."""
+    frame = pd.DataFrame.from_records(
+        units, columns=['definitionId', 'currentTier', 'relic', 'currentLevel', 'currentRarity', 'gp'])
+    # relic is a nested dict (or missing), the only field that needs a per-unit lookup
+    relic_tier = pd.Series([relic.get('currentTier', 0) if isinstance(relic, dict) and relic else None
+                            for relic in frame['relic']], dtype='float64')
+    has_relic = relic_tier.notna()
+
+    return pd.DataFrame({
+        'player_id': player_ids,
+        'base_id': frame['definitionId'].str.partition(':')[0],
+        'gear': pd.to_numeric(frame['currentTier'], errors='coerce').astype('Int64'),
+        'relic': (relic_tier - 2).where(has_relic, -3).astype('Int64'),
+        'level': pd.to_numeric(frame['currentLevel'], errors='coerce').astype('Int64'),
+        'stars': pd.to_numeric(frame['currentRarity'], errors='coerce').astype('Int64'),
+        'gp': pd.to_numeric(frame['gp'], errors='coerce').astype('Int64'),
+        'date': snapshot_date,
+    })
+
+
+def iter_unit_chunks(rosters, chunk_size: int = UNIT_CHUNK_ROWS):
+    """
+    Flatten player rosters into DataFrames of at most chunk_size unit rows.
+    rosters is a DataFrame or an iterable of {"player_id", "roster"} records, so it can be streamed.
+    """
+    if isinstance(rosters, pd.DataFrame):
+        rosters = rosters.to_dict('records')
+
+    snapshot_date = datetime.now().strftime('%Y%m%d')
+    player_ids, units = [], []
+
+    for row in rosters:
+        roster = row['roster'] or []
+        units.extend(roster)
+        player_ids.extend([row['player_id']] * len(roster))
+
+        while len(units) >= chunk_size:
+            yield _units_frame(player_ids[:chunk_size], units[:chunk_size], snapshot_date)
+            del player_ids[:chunk_size], units[:chunk_size]
+
+    if units:
+        yield _units_frame(player_ids, units, snapshot_date)
 
 
 def process_units_for_tracking(rosters):
     """Process player units and prepare them for tracking in the database."""
     logger.info("Processing units for tracking.")
-    records = []  # List to hold processed unit data
+    try:
+        chunks = list(iter_unit_chunks(rosters))
+        df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+        logger.info(f"Successfully processed {len(df)} units for tracking.")
+        return df
+    except Exception as e:
+        logger.error(f"Error processing units for tracking: {e}")
+        raise
 
+
+def load_units_for_tracking(connection, rosters, chunk_size: int = UNIT_CHUNK_ROWS):
+    """Flatten rosters chunk by chunk straight into stg_swgoh_ss_player, keeping peak memory per chunk."""
+    logger.info("Processing units for tracking.")
     try:
-        # Iterate over each row in the DataFrame containing player rosters
-        for _, row in rosters.iterrows():
-            # Iterate over each unit in the player's roster
-            for unit in row['roster']:
-                records.append({
-                    'player_id': row['player_id'],
-                    'base_id': unit['definitionId'].split(":")[0],
-                    'gear': unit.get('currentTier', None),
-                    'relic': int(unit['relic'].get('currentTier', 0)) - 2 if unit.get('relic') else -3,
-                    'level': unit.get('currentLevel', None),
-                    'stars': unit.get('currentRarity', None),
-                    'gp': unit.get('gp', None),
-                    'date': datetime.now().strftime('%Y%m%d')
-                })
-        logger.info(f"Successfully processed {len(records)} units for tracking.")
-        # Convert the list of records into a Pandas DataFrame
-        return pd.DataFrame(records)
+        total = 0
+        for index, chunk in enumerate(iter_unit_chunks(rosters, chunk_size)):
+            total += copy_dataframe(connection, chunk, "stg_swgoh_ss_player", truncate=index == 0)
+        if total == 0:
+            connection.execute(text('TRUNCATE TABLE "stg_swgoh_ss_player"'))
+        logger.info(f"Successfully staged {total} units for tracking.")
+        return total
     except Exception as e:
         logger.error(f"Error processing units for tracking: {e}")
         raise
 
 
+def _fetch_player(allycode):
+    player = comlink.get_player(allycode=allycode)
+    if is_error_response(player):
+        raise RuntimeError(f"Error response for ally code {allycode}: {player['message']}")
+    if "rosterUnit" not in player:
+        raise http_client.UnexpectedPayload(f"Unexpected response for ally code {allycode}.")
+    return player
+
+
+def _compute_stats(players: list):
+    """Send the rosters of several players to swgoh-stats in one request and split the result per player."""
+    units = [unit for player in players for unit in player["rosterUnit"]]
+    stats = comlink.get_unit_stats(units, flags=['onlyGP'])
+    if is_error_response(stats):
+        raise RuntimeError(f"Error response from swgoh-stats for a batch of {len(players)} players: {stats['message']}")
+    if not isinstance(stats, list) or len(stats) != len(units):
+        raise http_client.UnexpectedPayload(f"Unexpected swgoh-stats response for a batch of {len(players)} players.")
+
+    rosters, offset = [], 0
+    for player in players:
+        size = len(player["rosterUnit"])
+        rosters.append({"player_id": player["playerId"], "roster": stats[offset:offset + size]})
+        offset += size
+    return rosters
+
+
+def iter_player_rosters(players: list, max_workers: int = ROSTER_FETCH_WORKERS,
+                        batch_size: int = STATS_BATCH_PLAYERS, failed: list = None):
+    """
+    Fetch player rosters with stats, yielding {"player_id", "roster"} records as stats batches complete.
+    Player requests run concurrently and feed multi-player get_unit_stats batches while the remaining
+    players are still downloading. Failed players are logged and skipped; their ally codes are appended to failed.
+    """
+    if failed is None:
+        failed = []
+    logger.info(f"Fetching player rosters for {len(players)} players "
+                f"({max_workers} workers, {batch_size} players per stats batch).")
+    started = time.perf_counter()
+    progress = {"done": 0, "failed": 0}
+
+    def collect(future, batch):
+        try:
+            rosters = future.result()
+        except Exception as e:
+            logger.warning(f"Error computing stats for a batch of {len(batch)} players: {e}")
+            progress["failed"] += len(batch)
+            failed.extend(player.get("allyCode") for player in batch)
+            return []
+        progress["done"] += len(rosters)
+        elapsed = time.perf_counter() - started
+        logger.info(f"Rosters ready for {progress['done']}/{len(players)} players "
+                    f"({progress['done'] / elapsed:.1f} players/s).")
+        return rosters
+
+    with ThreadPoolExecutor(max_workers=max_workers) as player_pool, \
+            ThreadPoolExecutor(max_workers=STATS_WORKERS) as stats_pool:
+        player_futures = {player_pool.submit(http_client.retry, _fetch_player, allycode, retries=APP_RETRIES,
+                                             retry_on=(http_client.UnexpectedPayload,)): allycode
+                          for allycode in players}
+        stats_futures = {}
+        batch = []
+
+        for future in as_completed(player_futures):
+            try:
+                batch.append(future.result())
+            except Exception as e:
+                logger.warning(f"Error fetching player with ally code {player_futures[future]}: {e}")
+                progress["failed"] += 1
+                failed.append(player_futures[future])
+
+            if len(batch) >= batch_size:
+                stats_futures[stats_pool.submit(http_client.retry, _compute_stats, batch, retries=APP_RETRIES,
+                                                retry_on=(http_client.UnexpectedPayload,))] = batch
+                batch = []
+
+            for stats_future in [f for f in stats_futures if f.done()]:
+                yield from collect(stats_future, stats_futures.pop(stats_future))
+
+        if batch:
+            stats_futures[stats_pool.submit(http_client.retry, _compute_stats, batch, retries=APP_RETRIES,
+                                            retry_on=(http_client.UnexpectedPayload,))] = batch
+
+        for stats_future in as_completed(list(stats_futures)):
+            yield from collect(stats_future, stats_futures.pop(stats_future))
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Fetched {progress['done']} rosters in {elapsed:.2f}s "
+                f"({progress['done'] / elapsed if elapsed else 0:.1f} players/s, {progress['failed']} failed).")
+    if players and not progress["done"]:
+        raise RuntimeError(f"All {len(players)} roster requests failed.")
+
+
 def get_player_roster(players: list):
     """Fetch the roster data for each player based on their ally codes."""
-    logger.info(f"Fetching player rosters for {len(players)} players.")
     try:
-        player_data = []  # List to hold player data
-
-        for allycode in players:
-            logger.info(f"Fetching data for player with ally code: {allycode}")
-            # Retrieve player data using the SWGOH API client
-            player = comlink.get_player(allycode=allycode)
-            # Append the player data, including the roster and stats, to the list
-            player_data.append(
-                {
-                    "player_id": player["playerId"],
-                    "roster": comlink.get_unit_stats(player["rosterUnit"], flags=['onlyGP']),
-                    # "stat": player["profileStat"],
-                }
-            )
-        logger.info("Successfully fetched player rosters.")
         # Convert the list of player data into a Pandas DataFrame
-        return pd.DataFrame(player_data)
+        return pd.DataFrame(list(iter_player_rosters(players)))
     except Exception as e:
         logger.error(f"Error fetching player roster: {e}")
         raise
 
 
+def get_roster_as_of(connection, date: str):
+    """Rebuild the full roster snapshot for a YYYYMMDD date from the change-data-capture rows."""
+    return pd.read_sql_query(text("select * from swgoh_ss_player_as_of(:date)"), connection,
+                             params={"date": int(date)})
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SWGOH Player Roster Snapshot")
+    parser.add_argument('--mode', choices=SNAPSHOT_PROCEDURES, default=os.getenv("SNAPSHOT_MODE", "full"),
+                        help="full writes every unit; delta only writes units that changed since the last snapshot.")
+    args = parser.parse_args()
+
     try:
-        logger.info("Script execution started.")
-        engine = create_engine(os.getenv('DATABASE_URL'))
-        logger.info("Database engine created successfully.")
+        logger.info(f"Script execution started in {args.mode} mode.")
+        engine = get_engine()
+        migrate_if_enabled(engine)
 
         with engine.begin() as connection:
             logger.info("Database connection established. Processing roster data.")
             # Fetch player rosters and process them for tracking
             df_r = pd.read_csv(CSV_FILENAME)
             allycodes = df_r.iloc[:, 0].tolist()
-            df = process_units_for_tracking(get_player_roster(allycodes))
+            failed_players = []
+            rosters = iter_player_rosters(allycodes, failed=failed_players)
             logger.info("Uploading roster data to the database.")
-            # Upload the processed DataFrame to the database table `stg_snapshot_roster`
-            df.to_sql("stg_swgoh_ss_player", con=connection, if_exists="replace", index=False)
+            # Flatten the rosters in chunks straight into the staging table `stg_swgoh_ss_player`
+            load_units_for_tracking(connection, rosters)
             # Execute a stored procedure to insert data into the snapshot table
-            connection.execute(text("CALL insert_swgoh_ss_player()"))
+            if args.mode == "delta":
+                # Players missing from the snapshot are only recorded as removed when no roster request failed
+                connection.execute(text(f"CALL {SNAPSHOT_PROCEDURES[args.mode]}(:complete)"),
+                                   {"complete": not failed_players})
+            else:
+                connection.execute(text(f"CALL {SNAPSHOT_PROCEDURES[args.mode]}()"))
             logger.info("Data successfully inserted into the database.")
     except Exception as e:
         logger.error(f"An error occurred during script execution: {e}")
+    finally:
+        http_client.log_stats(logger)
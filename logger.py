@@ -1,57 +1,143 @@
 import logging
 import os
+import queue
+import threading
+import time
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, Table, Column, Integer, String, MetaData, DateTime
-from sqlalchemy.orm import sessionmaker
 from datetime import datetime
 
+_STOP = object()
+TABLE_RETRY_INTERVAL = 30  # segundos entre tentativas de criar a tabela de logs
+
 
 class DatabaseHandler(logging.Handler):
-    def __init__(self, db_url, table_name='logs'):
+    def __init__(self, engine=None, table_name='logs', batch_size=200, flush_interval=2.0, queue_size=10000,
+                 spill_path=None):
         super().__init__()
-        self.engine = create_engine(db_url)
-        self.Session = sessionmaker(bind=self.engine)
-
-        # Definindo a tabela de logs
-        self.metadata = MetaData()
-        self.logs_table = Table(
-            table_name, self.metadata,
-            Column('id', Integer, primary_key=True, autoincrement=True),
-            Column('timestamp', DateTime, nullable=False),
-            Column('level', String(50), nullable=False),
-            Column('message', String, nullable=False)
-        )
-
-        # Criação da tabela, se ela ainda não existir
-        self.metadata.create_all(self.engine)
+        self.engine = engine
+        self.table_name = table_name
+        self.logs_table = None
+        self._table_retry_at = 0.0
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path or os.getenv('LOG_SPILL_PATH', './logs_spill.log')
+
+        # A conexão com o banco e a criação da tabela ficam para a thread de gravação (ver _ensure_table),
+        # assim importar o logger não importa o SQLAlchemy nem espera pelo Postgres
+
+        # Os registros vão para uma fila e são gravados em lote por uma thread em segundo plano
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._spill_lock = threading.Lock()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name='log-db-writer', daemon=True)
+        self._worker.start()
 
     def emit(self, record):
-        session = self.Session()
         try:
-            log_entry = self.format(record)
-            timestamp = datetime.now()
+            entry = {
+                'timestamp': datetime.fromtimestamp(record.created),
+                'level': record.levelname,
+                'message': self.format(record),
+            }
+        except Exception:
+            self.handleError(record)
+            return
+
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            # Fila cheia: o log vai para o arquivo local em vez de bloquear quem está logando
+            self._spill([entry])
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._write(batch)
+                return
+            if item is not None:
+                batch.append(item)
+
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._write(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def _ensure_table(self):
+        if self.logs_table is not None:
+            return True
+        if time.monotonic() < self._table_retry_at:
+            return False
+        try:
+            from sqlalchemy import Table, Column, Integer, String, MetaData, DateTime
+            from db import get_engine
+
+            if self.engine is None:
+                self.engine = get_engine()
 
-            insert_stmt = self.logs_table.insert().values(
-                timestamp=timestamp,
-                level=record.levelname,
-                message=log_entry
+            # Definindo a tabela de logs
+            metadata = MetaData()
+            logs_table = Table(
+                self.table_name, metadata,
+                Column('id', Integer, primary_key=True, autoincrement=True),
+                Column('timestamp', DateTime, nullable=False),
+                Column('level', String(50), nullable=False),
+                Column('message', String, nullable=False)
             )
-            session.execute(insert_stmt)
-            session.commit()
+
+            # Criação da tabela, se ela ainda não existir
+            metadata.create_all(self.engine)
+            self.logs_table = logs_table
+            return True
+        except Exception as e:
+            # Banco indisponível: os logs vão para o arquivo local e a criação é tentada de novo mais tarde
+            print(f"Erro ao preparar a tabela de logs: {e}")
+            self._table_retry_at = time.monotonic() + TABLE_RETRY_INTERVAL
+            return False
+
+    def _write(self, batch):
+        if not batch:
+            return
+        if not self._ensure_table():
+            self._spill(batch)
+            return
+        try:
+            # Um único INSERT com várias linhas por lote
+            with self.engine.begin() as connection:
+                connection.execute(self.logs_table.insert(), batch)
         except Exception as e:
             print(f"Erro ao gravar log no banco de dados: {e}")
-            session.rollback()
-        finally:
-            session.close()
+            self._spill(batch)
+
+    def _spill(self, entries):
+        try:
+            with self._spill_lock, open(self.spill_path, 'a', encoding='utf-8') as file:
+                for entry in entries:
+                    file.write(f"{entry['timestamp'].isoformat()} {entry['level']} {entry['message']}\n")
+        except Exception as e:
+            print(f"Erro ao gravar log no arquivo {self.spill_path}: {e}")
 
     def close(self):
+        # Chamado pelo logging.shutdown na saída do processo: grava o que ainda está na fila
+        if not self._closed:
+            self._closed = True
+            try:
+                self.queue.put(_STOP, timeout=self.flush_interval)
+                self._worker.join(timeout=10)
+            except queue.Full:
+                print("Fila de logs cheia ao encerrar; registros pendentes podem ter sido perdidos.")
         super().close()
 
 
 def setup_logging():
     load_dotenv(dotenv_path='.env')
-    db_url = os.getenv('DATABASE_URL')
 
     logger = logging.getLogger('hunter')
 
@@ -59,10 +145,10 @@ def setup_logging():
     if not any(isinstance(handler, DatabaseHandler) for handler in logger.handlers):
         logger.setLevel(logging.INFO)
 
-        db_handler = DatabaseHandler(db_url)
+        db_handler = DatabaseHandler()
         formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
         db_handler.setFormatter(formatter)
 
         logger.addHandler(db_handler)
 
-    return logger
\ No newline at end of file
+    return logger
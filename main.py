@@ -1,42 +1,119 @@
 import pandas as pd
-from sqlalchemy import create_engine, text
-from swgoh_comlink import SwgohComlink
+from sqlalchemy import text
+from db import get_engine, notify_etl_complete
+from http_client import PooledComlink
+import http_client
+from comlink_cache import CachedComlink
 from dotenv import load_dotenv
 from datetime import datetime, timezone
 from logger import setup_logging
+from bulk_load import copy_dataframe
+from migrate import migrate_if_enabled
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
+import threading
+import time
 import argparse
 
 logger = setup_logging()
 load_dotenv()
-comlink = SwgohComlink()
+comlink = CachedComlink(PooledComlink())
+PLAYER_FETCH_WORKERS = int(os.getenv("PLAYER_FETCH_WORKERS", "8"))
+GUILD_WORKERS = int(os.getenv("GUILD_WORKERS", "4"))
+# SCD2 merge of stg_swgoh_player into d_swgoh_player (sql_scripts/migrations/003_player_scd2_merge.sql)
+MERGE_PLAYERS = text("select * from merge_swgoh_players(:guild_id, cast(:members as text[]))")
 
 
-def get_player_meta(players: list):
+class GuildFetcher:
+    """
+    Per-run fetch layer for guild payloads.
+    The guild is requested once with recent activity info and shared by every extractor of the run;
+    pass refresh=True to force a new request.
+    """
+
+    def __init__(self, client=None):
+        self.client = client or comlink
+        self.requests = 0
+        self._guilds = {}
+        self._lock = threading.Lock()
+
+    def get_guild(self, guild_id: str, refresh: bool = False):
+        with self._lock:
+            if refresh or guild_id not in self._guilds:
+                logger.info(f"Fetching guild payload for guild {guild_id}.")
+                self._guilds[guild_id] = self.client.get_guild(guild_id=guild_id,
+                                                               include_recent_guild_activity_info=True)
+                self.requests += 1
+            return self._guilds[guild_id]
+
+
+def _fetch_player(player_id: str):
+    """Fetch a single player's metadata, returning the record and the call duration in seconds."""
+    started = time.perf_counter()
+    player = comlink.get_player(player_id=player_id)
+    record = {
+        "player_id": player["playerId"],
+        "name": player["name"],
+        "allycode": player["allyCode"],
+        "guild_id": player["guildId"],
+    }
+    return record, time.perf_counter() - started
+
+
+def get_player_meta(players: list, max_workers: int = PLAYER_FETCH_WORKERS):
+    """
+    Fetch player metadata for every player id, keeping the input order.
+    With max_workers > 1 the requests run on a thread pool; max_workers <= 1 keeps the serial path.
+    Players that fail are logged and skipped, and their ids are kept in df.attrs["failed_players"].
+    """
     try:
-        logger.info("Starting player data collection.")
-        player_data = []
-        for player_id in players:
-            player = comlink.get_player(player_id=player_id)
-            player_data.append(
-                {
-                    "player_id": player["playerId"],
-                    "name": player["name"],
-                    "allycode": player["allyCode"],
-                    "guild_id": player["guildId"],
-                }
-            )
-        logger.info(f"Successfully collected data for {len(player_data)} players.")
-        return pd.DataFrame(player_data)
+        logger.info(f"Starting player data collection for {len(players)} players with {max_workers} workers.")
+        started = time.perf_counter()
+        results = [None] * len(players)
+        failed_players = []
+        call_time = 0.0
+
+        if max_workers <= 1:
+            for index, player_id in enumerate(players):
+                try:
+                    results[index], elapsed = _fetch_player(player_id)
+                    call_time += elapsed
+                except Exception as e:
+                    logger.warning(f"Error collecting data for player {player_id}: {e}")
+                    failed_players.append(player_id)
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(_fetch_player, player_id): index for index, player_id in enumerate(players)}
+                for future in as_completed(futures):
+                    index = futures[future]
+                    try:
+                        results[index], elapsed = future.result()
+                        call_time += elapsed
+                    except Exception as e:
+                        logger.warning(f"Error collecting data for player {players[index]}: {e}")
+                        failed_players.append(players[index])
+
+        player_data = [record for record in results if record is not None]
+        if players and not player_data:
+            raise RuntimeError(f"All {len(players)} player requests failed.")
+
+        wall_time = time.perf_counter() - started
+        logger.info(
+            f"Successfully collected data for {len(player_data)} players in {wall_time:.2f}s "
+            f"(serial path estimate {call_time:.2f}s, {len(failed_players)} failed)."
+        )
+        df = pd.DataFrame(player_data)
+        df.attrs["failed_players"] = failed_players
+        return df
     except Exception as e:
         logger.error(f"Error collecting player data: {e}")
         raise
 
 
-def get_guild_meta(guild_id: str):
+def get_guild_meta(guild_id: str, fetcher: GuildFetcher = None, refresh: bool = False):
     try:
         logger.info(f"Starting guild data collection for guild {guild_id}.")
-        guild = comlink.get_guild(guild_id=guild_id, include_recent_guild_activity_info=False)
+        guild = (fetcher or GuildFetcher()).get_guild(guild_id, refresh=refresh)
         logger.info(f"Successfully collected data for guild {guild_id}.")
         return pd.DataFrame([
             {
@@ -51,10 +128,10 @@ def get_guild_meta(guild_id: str):
         raise
 
 
-def get_tickets(guild_id: str):
+def get_tickets(guild_id: str, fetcher: GuildFetcher = None, refresh: bool = False):
     try:
         logger.info(f"Starting ticket data collection for guild {guild_id}.")
-        guild = comlink.get_guild(guild_id=guild_id, include_recent_guild_activity_info=True)
+        guild = (fetcher or GuildFetcher()).get_guild(guild_id, refresh=refresh)
         guild_tickets = []
 
         for member in guild["member"]:
@@ -77,10 +154,10 @@ def get_tickets(guild_id: str):
         raise
 
 
-def get_raid_result(guild_id: str):
+def get_raid_result(guild_id: str, fetcher: GuildFetcher = None, refresh: bool = False):
     try:
         logger.info(f"Starting raid result data collection for guild {guild_id}.")
-        guild = comlink.get_guild(guild_id=guild_id, include_recent_guild_activity_info=True)
+        guild = (fetcher or GuildFetcher()).get_guild(guild_id, refresh=refresh)
         guild_raid_points = []
 
         for raid_result in guild["recentRaidResult"]:
@@ -101,41 +178,111 @@ def get_raid_result(guild_id: str):
         raise
 
 
-def main(guild_id: str):
+def main(guild_id: str, max_workers: int = PLAYER_FETCH_WORKERS, engine=None):
     try:
         logger.info(f"Starting main execution for guild {guild_id}.")
 
-        df_tickets = get_tickets(guild_id=guild_id)
-        df_player = get_player_meta(players=df_tickets["player_id"].to_list())
-        df_guild = get_guild_meta(guild_id=guild_id)
-        df_raid_result = get_raid_result(guild_id=guild_id)
+        fetcher = GuildFetcher()
+        df_tickets = get_tickets(guild_id=guild_id, fetcher=fetcher)
+        df_player = get_player_meta(players=df_tickets["player_id"].to_list(), max_workers=max_workers)
+        df_guild = get_guild_meta(guild_id=guild_id, fetcher=fetcher)
+        df_raid_result = get_raid_result(guild_id=guild_id, fetcher=fetcher)
+        logger.info(f"Guild extraction for {guild_id} used {fetcher.requests} get_guild request(s).")
 
-        logger.info("Connecting to the database.")
-        engine = create_engine(os.getenv('DATABASE_URL'))
+        if engine is None:
+            engine = get_engine()
 
+        # One transaction per guild, so a failure only rolls back its own guild. The staging tables are
+        # temporary copies private to the transaction, so concurrent guilds also load in parallel.
         with engine.begin() as connection:
-            logger.info("Inserting data into the database.")
-            df_guild.to_sql("stg_swgoh_guild", con=connection, if_exists="replace", index=False)
-            df_player.to_sql("stg_swgoh_player", con=connection, if_exists="replace", index=False)
-            df_tickets.to_sql("stg_swgoh_tickets", con=connection, if_exists="replace", index=False)
-            df_raid_result.to_sql("stg_swgoh_raids", con=connection, if_exists='replace', index=False)
+            logger.info(f"Inserting data into the database for guild {guild_id}.")
+            copy_dataframe(connection, df_guild, "stg_swgoh_guild", temporary=True)
+            copy_dataframe(connection, df_player, "stg_swgoh_player", temporary=True)
+            copy_dataframe(connection, df_tickets, "stg_swgoh_tickets", temporary=True)
+            copy_dataframe(connection, df_raid_result, "stg_swgoh_raids", temporary=True)
 
             connection.execute(text("CALL insert_swgoh_guilds()"))
-            connection.execute(text(f"CALL insert_swgoh_players('{guild_id}')"))
+            # "Left the guild" comes from the member list, so a player whose request failed keeps its row
+            merged = connection.execute(MERGE_PLAYERS, {"guild_id": guild_id,
+                                                        "members": df_tickets["player_id"].to_list()}).one()
+            logger.info(f"Player dimension for guild {guild_id}: {merged.inserted} inserted, "
+                        f"{merged.expired} expired, {merged.unchanged} unchanged.")
             connection.execute(text("CALL insert_swgoh_tickets()"))
+            connection.execute(text("CALL refresh_swgoh_tickets_daily()"))
             connection.execute(text("CALL insert_swgoh_raids()"))
+            notify_etl_complete(connection, guild_id)
 
-        logger.info("Data successfully inserted into the database.")
+        logger.info(f"Data successfully inserted into the database for guild {guild_id}.")
     except Exception as e:
         logger.error(f"Error during main execution for guild {guild_id}: {e}")
         raise
 
 
+def get_registered_guilds(engine):
+    """Return the ids of the active guilds in the etl_guild_registry table."""
+    with engine.connect() as connection:
+        result = connection.execute(text("select guild_id from etl_guild_registry where active order by guild_id"))
+        return [row.guild_id for row in result]
+
+
+def run_batch(guild_ids: list, guild_workers: int = GUILD_WORKERS, max_workers: int = PLAYER_FETCH_WORKERS,
+              engine=None):
+    """
+    Run the guild ETL for several guilds in one process, sharing the pooled engine (size it with DB_POOL_SIZE).
+    Each guild runs in its own transaction; returns the list of guilds that failed.
+    """
+    guild_workers = max(1, min(guild_workers, len(guild_ids) or 1))
+    if engine is None:
+        engine = get_engine()
+
+    logger.info(f"Starting batch for {len(guild_ids)} guilds with {guild_workers} workers.")
+    started = time.perf_counter()
+    failed_guilds = []
+
+    with ThreadPoolExecutor(max_workers=guild_workers) as executor:
+        futures = {
+            executor.submit(main, guild_id, max_workers=max_workers, engine=engine): guild_id
+            for guild_id in guild_ids
+        }
+        for future in as_completed(futures):
+            guild_id = futures[future]
+            try:
+                future.result()
+            except Exception:
+                # main() already logged the cause
+                failed_guilds.append(guild_id)
+
+    logger.info(
+        f"Batch completed in {time.perf_counter() - started:.2f}s: "
+        f"{len(guild_ids) - len(failed_guilds)} succeeded, {len(failed_guilds)} failed."
+    )
+    return failed_guilds
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="SWGOH Guild Data Collection")
-    parser.add_argument('guild_id', type=str)
+    parser.add_argument('guild_ids', type=str, nargs='*')
+    parser.add_argument('--registry', action='store_true',
+                        help="Also process the active guilds listed in etl_guild_registry.")
+    parser.add_argument('--guild-workers', type=int, default=GUILD_WORKERS,
+                        help="Guilds processed in parallel.")
+    parser.add_argument('--workers', type=int, default=PLAYER_FETCH_WORKERS,
+                        help="Concurrent player requests (1 keeps the serial path).")
     args = parser.parse_args()
 
-    logger.info(f"Starting process for guild {args.guild_id}.")
-    main(args.guild_id)
-    logger.info(f"Process for guild {args.guild_id} completed.")
+    if not args.guild_ids and not args.registry:
+        parser.error("pass at least one guild_id or --registry")
+
+    engine = get_engine()
+    migrate_if_enabled(engine)
+    guild_ids = list(args.guild_ids)
+    if args.registry:
+        guild_ids += [guild_id for guild_id in get_registered_guilds(engine) if guild_id not in guild_ids]
+
+    logger.info(f"Starting process for guilds {', '.join(guild_ids)}.")
+    failed = run_batch(guild_ids, guild_workers=args.guild_workers, max_workers=args.workers, engine=engine)
+    http_client.log_stats(logger)
+    if failed:
+        logger.error(f"Process finished with failures for guilds {', '.join(failed)}.")
+        raise SystemExit(1)
+    logger.info(f"Process for guilds {', '.join(guild_ids)} completed.")
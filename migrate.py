@@ -0,0 +1,166 @@
+import argparse
+import hashlib
+import os
+import re
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+from db import get_engine
+from logger import setup_logging
+
+load_dotenv()
+logger = setup_logging()
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sql_scripts", "migrations")
+PARTITION_FACTS_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sql_scripts", "partition_facts.sql")
+MIGRATION_FILE = re.compile(r"^(\d{3})_(\w+)\.sql$")
+MIGRATION_LOCK_ID = 4_860_211  # pg_advisory_lock key shared by every process that runs migrations
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "true").lower() in ("1", "true", "yes")
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+
+CREATE_MIGRATIONS_TABLE = text("""
+    create table if not exists schema_migrations
+    (
+        version    integer primary key,
+        name       text      not null,
+        checksum   text      not null,
+        applied_at timestamp not null default now()
+    )
+""")
+APPLIED_QUERY = text("select version, name, checksum from schema_migrations order by version")
+RECORD_MIGRATION = text("insert into schema_migrations (version, name, checksum) values (:version, :name, :checksum)")
+
+
+def list_migrations(directory: str = MIGRATIONS_DIR):
+    """Return (version, name, path) of the migration files NNN_name.sql, ordered by version."""
+    migrations = []
+    for file_name in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE.match(file_name)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(directory, file_name)))
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Duplicate migration versions in {directory}.")
+    return migrations
+
+
+def _checksum(sql: str):
+    return hashlib.sha256(sql.encode("utf-8")).hexdigest()
+
+
+@contextmanager
+def _migration_lock(connection):
+    """Hold the session advisory lock that serializes the processes changing the schema."""
+    connection.execute(text("select pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+    connection.commit()
+    try:
+        yield
+    finally:
+        connection.execute(text("select pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+        connection.commit()
+
+
+def _ensure_partitions(connection):
+    with connection.begin():
+        connection.execute(text("CALL ensure_monthly_partitions(:months)"), {"months": PARTITION_MONTHS_AHEAD})
+
+
+def run_migrations(engine=None, directory: str = MIGRATIONS_DIR):
+    """
+    Apply the pending migrations in version order, each in its own transaction, then create the monthly
+    partitions of the next PARTITION_MONTHS_AHEAD months. A session advisory lock serializes concurrent loaders.
+    Returns the versions applied.
+    """
+    if engine is None:
+        engine = get_engine()
+    applied_now = []
+    with engine.connect() as connection, _migration_lock(connection):
+        try:
+            with connection.begin():
+                connection.execute(CREATE_MIGRATIONS_TABLE)
+                applied = {row.version: row for row in connection.execute(APPLIED_QUERY)}
+
+            for version, name, path in list_migrations(directory):
+                with open(path, encoding="utf-8") as file:
+                    sql = file.read()
+                checksum = _checksum(sql)
+                if version in applied:
+                    if applied[version].checksum != checksum:
+                        logger.warning(f"Migration {version:03d}_{name} changed after it was applied.")
+                    continue
+
+                logger.info(f"Applying migration {version:03d}_{name}.")
+                with connection.begin():
+                    # Raw DBAPI cursor: the file may hold several statements and literal % signs
+                    with connection.connection.cursor() as cursor:
+                        cursor.execute(sql)
+                    connection.execute(RECORD_MIGRATION, {"version": version, "name": name, "checksum": checksum})
+                applied_now.append(version)
+
+            _ensure_partitions(connection)
+        except Exception as e:
+            logger.error(f"Error running migrations: {e}")
+            raise
+
+    if applied_now:
+        logger.info(f"Applied migrations: {applied_now}")
+    return applied_now
+
+
+def migrate_if_enabled(engine=None):
+    """Entry point for the loaders: run the migrations unless AUTO_MIGRATE is disabled."""
+    if AUTO_MIGRATE:
+        run_migrations(engine)
+
+
+def partition_facts(engine=None, path: str = PARTITION_FACTS_SQL):
+    """
+    Convert the facts listed in partition_facts.sql to monthly partitions. Each conversion copies the whole table
+    under an exclusive lock, so this is an explicit step (`python migrate.py --partition`), never run by the loaders.
+    """
+    if engine is None:
+        engine = get_engine()
+    with open(path, encoding="utf-8") as file:
+        sql = file.read()
+    with engine.connect() as connection, _migration_lock(connection):
+        try:
+            with connection.begin(), connection.connection.cursor() as cursor:
+                cursor.execute(sql)
+            _ensure_partitions(connection)
+        except Exception as e:
+            logger.error(f"Error partitioning the facts: {e}")
+            raise
+    logger.info("Facts partitioned by month.")
+
+
+def archive_partitions(keep_months: int, engine=None):
+    """Detach the monthly partitions older than keep_months and move them to the archive schema."""
+    if engine is None:
+        engine = get_engine()
+    with engine.begin() as connection:
+        connection.execute(text("CALL archive_monthly_partitions(:keep)"), {"keep": keep_months})
+    logger.info(f"Archived partitions older than {keep_months} months.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Database migrations")
+    parser.add_argument("--status", action="store_true", help="List the migrations and whether they were applied.")
+    parser.add_argument("--partition", action="store_true",
+                        help="Convert the facts to monthly partitions (copies each table, run it off-peak).")
+    parser.add_argument("--archive-months", type=int,
+                        help="Detach partitions older than this many months into the archive schema.")
+    args = parser.parse_args()
+
+    if args.status:
+        with get_engine().begin() as connection:
+            connection.execute(CREATE_MIGRATIONS_TABLE)
+            applied = {row.version for row in connection.execute(APPLIED_QUERY)}
+        for version, name, _ in list_migrations():
+            print(f"{version:03d}_{name:<40}{'applied' if version in applied else 'pending'}")
+    else:
+        run_migrations()
+        if args.partition:
+            partition_facts()
+        if args.archive_months is not None:
+            archive_partitions(args.archive_months)
@@ -0,0 +1,118 @@
+import asyncio
+import os
+import time
+from datetime import date
+
+import asyncpg
+
+import db_async
+from logger import setup_logging
+from db import ETL_NOTIFY_CHANNEL
+from bot_utils import plot_ticket_report, query_tickets_missed
+
+logger = setup_logging()
+
+LISTEN_RECONNECT_DELAY = 10  # seconds
+REPORT_CACHE_TTL = float(os.getenv("REPORT_CACHE_TTL", "900"))  # seconds an entry is served without recomputing
+
+
+class ReportCache:
+    """
+    Per-guild in-memory cache of report results (ticket chart PNG bytes and missed-ticket DataFrames).
+    Entries live for ttl seconds, until the ETL notifies that the guild was reloaded or until the day changes
+    (the reports are relative to the current date); identical requests in flight share one computation.
+    """
+
+    def __init__(self, ttl: float = REPORT_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}  # guild_id -> {key: (day computed, expires at, value)}
+        self._pending = {}  # (guild_id, key) -> asyncio.Task
+        self._refreshes = set()  # refresh tasks started by notifications, kept so they are not garbage-collected
+        self._listener = None
+
+    async def get(self, guild_id: str, key: tuple, func, *args):
+        """Return the cached value for (guild_id, key), awaiting func(*args) on a miss."""
+        cached = self._entries.get(guild_id, {}).get(key)
+        if cached is not None and cached[0] == date.today() and cached[1] > time.monotonic():
+            return cached[2]
+
+        pending = self._pending.get((guild_id, key))
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        task = asyncio.ensure_future(func(*args))
+        self._pending[(guild_id, key)] = task
+        try:
+            value = await asyncio.shield(task)
+        finally:
+            self._pending.pop((guild_id, key), None)
+        # None means no data (or a failed render): do not keep it
+        if value is not None:
+            self._entries.setdefault(guild_id, {})[key] = (date.today(), time.monotonic() + self.ttl, value)
+        return value
+
+    async def get_ticket_chart(self, guild_id: str):
+        """PNG bytes of the ticket report chart, or None if there is no data."""
+        return await self.get(guild_id, ("chart",), _render_chart, guild_id)
+
+    async def get_tickets_missed(self, guild_id: str, days: str):
+        return await self.get(guild_id, ("missed", str(days)), query_tickets_missed, guild_id, days)
+
+    def invalidate(self, guild_id: str):
+        """Drop the guild's entries and return the keys that were cached."""
+        return list(self._entries.pop(guild_id, {}))
+
+    async def refresh(self, guild_id: str):
+        """Invalidate the guild and pre-warm the reports that were cached before."""
+        keys = self.invalidate(guild_id)
+        logger.info(f"Report cache invalidated for guild {guild_id}, pre-warming {len(keys)} report(s).")
+        for key in keys:
+            try:
+                if key[0] == "chart":
+                    await self.get_ticket_chart(guild_id)
+                elif key[0] == "missed":
+                    await self.get_tickets_missed(guild_id, key[1])
+            except Exception as e:
+                logger.error(f"Error pre-warming report {key} for guild {guild_id}: {e}")
+
+    def start_listener(self):
+        """Start a task that LISTENs for ETL notifications and refreshes the notified guild."""
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    def _on_notify(self, connection, pid, channel, guild_id):
+        task = asyncio.create_task(self.refresh(guild_id))
+        self._refreshes.add(task)
+        task.add_done_callback(self._on_refresh_done)
+
+    def _on_refresh_done(self, task):
+        self._refreshes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Error refreshing the report cache: {task.exception()}")
+
+    async def _listen(self):
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(db_async.get_dsn())
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(ETL_NOTIFY_CHANNEL, self._on_notify)
+                logger.info(f"Report cache listening for ETL notifications on '{ETL_NOTIFY_CHANNEL}'.")
+                await closed.wait()
+                logger.warning("Report cache listener connection closed, reconnecting.")
+            except asyncio.CancelledError:
+                if connection is not None:
+                    await connection.close()
+                raise
+            except Exception as e:
+                logger.error(f"Report cache listener error, reconnecting in {LISTEN_RECONNECT_DELAY}s: {e}")
+            await asyncio.sleep(LISTEN_RECONNECT_DELAY)
+
+
+async def _render_chart(guild_id: str):
+    report = await plot_ticket_report(guild_id)
+    return report.getvalue() if report is not None else None
+
+
+report_cache = ReportCache()
@@ -0,0 +1,215 @@
+import asyncio
+import heapq
+import itertools
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import db_async
+from logger import setup_logging
+
+logger = setup_logging()
+
+JOB_RELOAD_INTERVAL = timedelta(hours=1)
+CATCH_UP_WINDOW = timedelta(hours=int(os.getenv("SCHEDULE_CATCH_UP_HOURS", "24")))
+
+JOBS_QUERY = """
+    select id, guild_id, guild_name, report_type, cron, channel_id, days, last_run_at
+    from bot_schedule
+    where active
+"""
+MARK_RUN_QUERY = "update bot_schedule set last_run_at = $2 where id = $1"
+
+# Used when the bot_schedule table is not available
+DEFAULT_JOBS = [
+    # (guild_id, guild_name, report_type, cron, days)
+    ("1HE3bh3LRcWVOto5KuGvzQ", "Awakening Fear", "tickets", "31 17 * * *", 0),
+    ("iO-khl_0TVu64OussT1Y7g", "Awakening Hope", "tickets", "31 22 * * *", 0),
+    ("1HE3bh3LRcWVOto5KuGvzQ", "Awakening Fear", "missed", "32 17 * * 0", 7),
+    ("iO-khl_0TVu64OussT1Y7g", "Awakening Hope", "missed", "32 22 * * 0", 7),
+]
+
+
+class CronSchedule:
+    """
+    Five-field cron expression (minute hour day-of-month month day-of-week, Sunday = 0 or 7).
+    Fields accept '*', numbers, lists, ranges and steps such as '*/15' or '1-5'.
+    """
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Invalid cron expression '{expression}': expected 5 fields.")
+        self.expression = expression
+        self.minutes = _parse_field(fields[0], 0, 59)
+        self.hours = _parse_field(fields[1], 0, 23)
+        self.days = _parse_field(fields[2], 1, 31)
+        self.months = _parse_field(fields[3], 1, 12)
+        self.weekdays = {day % 7 for day in _parse_field(fields[4], 0, 7)}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def _day_matches(self, moment: datetime):
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, moment: datetime):
+        """First matching minute strictly after moment."""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months or not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression '{self.expression}' never matches.")
+
+    def last_between(self, start: datetime, end: datetime):
+        """Last matching minute after start and at or before end, or None."""
+        last, candidate = None, self.next_after(start)
+        while candidate <= end:
+            last, candidate = candidate, self.next_after(candidate)
+        return last
+
+
+def _parse_field(field: str, low: int, high: int):
+    values = set()
+    for part in field.split(","):
+        part, _, step = part.partition("/")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(value) for value in part.split("-", 1))
+        else:
+            start = end = int(part)
+        if start < low or end > high or start > end:
+            raise ValueError(f"Cron field '{field}' out of range {low}-{high}.")
+        values.update(range(start, end + 1, int(step) if step else 1))
+    return values
+
+
+@dataclass
+class Job:
+    id: int
+    guild_id: str
+    guild_name: str
+    report_type: str
+    cron: CronSchedule
+    channel_id: int = None
+    days: int = 0
+    last_run_at: datetime = None
+
+
+class Scheduler:
+    """
+    Runs report jobs from the bot_schedule table on a heap of next-run times.
+    The loop sleeps until the earliest job is due, so it only wakes up when there is work to do.
+    Runs missed while the bot was down (within CATCH_UP_WINDOW) are executed once on startup. A job that never
+    recorded a run (last_run_at null, e.g. the DEFAULT_JOBS fallback) catches up its last occurrence in the window.
+    """
+
+    def __init__(self, bot, handlers: dict):
+        self.bot = bot
+        self.handlers = handlers
+        self._heap = []
+        self._sequence = itertools.count()
+        self._task = None
+        self._running = set()  # job tasks, kept so they are not garbage-collected
+        self._generation = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def load_jobs(self):
+        try:
+            rows = await db_async.fetch(JOBS_QUERY)
+            jobs = [Job(row["id"], row["guild_id"], row["guild_name"], row["report_type"], CronSchedule(row["cron"]),
+                        row["channel_id"], row["days"] or 0, row["last_run_at"]) for row in rows]
+            logger.info(f"Loaded {len(jobs)} scheduled jobs from bot_schedule.")
+        except Exception as e:
+            logger.error(f"Error loading bot_schedule, using the default jobs: {e}")
+            jobs = [Job(None, guild_id, guild_name, report_type, CronSchedule(cron), days=days)
+                    for guild_id, guild_name, report_type, cron, days in DEFAULT_JOBS]
+        return [job for job in jobs if self._known(job)]
+
+    def _known(self, job: Job):
+        if job.report_type not in self.handlers:
+            logger.warning(f"Skipping job {job.id}: unknown report type '{job.report_type}'.")
+            return False
+        return True
+
+    @staticmethod
+    def _job_key(job: Job):
+        return job.id, job.guild_id, job.report_type, job.cron.expression, job.channel_id, job.days
+
+    async def schedule_jobs(self, catch_up: bool):
+        """
+        Rebuild the heap from the job table; with catch_up, overdue jobs are queued to run now.
+        Jobs that did not change keep their pending run, so a run due in the current minute is not skipped.
+        """
+        jobs = await self.load_jobs()
+        now = datetime.now()
+        pending = {self._job_key(job): due for due, _, generation, job in self._heap
+                   if job is not None and generation == self._generation}
+        self._generation += 1
+        self._heap = []
+        for job in jobs:
+            due = pending.get(self._job_key(job)) or job.cron.next_after(now)
+            if catch_up:
+                if job.last_run_at is not None:
+                    missed = job.cron.next_after(job.last_run_at)
+                else:
+                    missed = job.cron.last_between(now - CATCH_UP_WINDOW, now)
+                if missed is not None and missed <= now and now - missed <= CATCH_UP_WINDOW:
+                    logger.info(f"Catching up {job.report_type} job for {job.guild_name} missed at {missed}.")
+                    due = now
+            self._push(due, job)
+        self._push(now + JOB_RELOAD_INTERVAL, None)
+
+    def _push(self, due: datetime, job):
+        heapq.heappush(self._heap, (due, next(self._sequence), self._generation, job))
+
+    async def _run(self):
+        await self.schedule_jobs(catch_up=True)
+        while True:
+            due, _, generation, job = self._heap[0]
+            delay = (due - datetime.now()).total_seconds()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            heapq.heappop(self._heap)
+            if generation != self._generation:
+                continue
+            if job is None:
+                await self.schedule_jobs(catch_up=False)
+                continue
+            task = asyncio.create_task(self._execute(job, due))
+            self._running.add(task)
+            task.add_done_callback(self._on_job_done)
+            self._push(job.cron.next_after(max(due, datetime.now())), job)
+
+    def _on_job_done(self, task):
+        self._running.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Error running a scheduled job: {task.exception()}")
+
+    async def _execute(self, job: Job, due: datetime):
+        logger.info(f"Running {job.report_type} job for {job.guild_name} scheduled at {due}.")
+        try:
+            await self.handlers[job.report_type](self.bot, job)
+        except Exception as e:
+            logger.error(f"Error running {job.report_type} job for {job.guild_name} scheduled at {due}: {e}")
+        job.last_run_at = due
+        if job.id is not None:
+            try:
+                await db_async.execute(MARK_RUN_QUERY, job.id, due)
+            except Exception as e:
+                logger.error(f"Error recording the run of job {job.id}: {e}")
@@ -59,3 +59,168 @@ create table if not exists public.f_raid_result
     primary key (sk_guild, sk_player, sk_time)
 );
 
+
+create table if not exists public.etl_guild_registry
+(
+    guild_id varchar(255) not null primary key,
+    name     varchar(255),
+    active   bool not null default true
+);
+
+-- Persistent staging tables, truncated and reloaded with COPY by bulk_load.copy_dataframe
+create unlogged table if not exists public.stg_swgoh_guild
+(
+    guild_id    text,
+    name        text,
+    guild_reset text
+);
+
+create unlogged table if not exists public.stg_swgoh_player
+(
+    player_id text,
+    name      text,
+    allycode  text,
+    guild_id  text
+);
+
+create unlogged table if not exists public.stg_swgoh_tickets
+(
+    guild_id  text,
+    player_id text,
+    tickets   bigint,
+    date      text
+);
+
+create unlogged table if not exists public.stg_swgoh_raids
+(
+    guild_id  text,
+    raid_id   text,
+    player_id text,
+    points    text,
+    date      text
+);
+
+create unlogged table if not exists public.stg_swgoh_ss_player
+(
+    player_id text,
+    base_id   text,
+    gear      bigint,
+    relic     bigint,
+    level     bigint,
+    stars     bigint,
+    gp        bigint,
+    date      text
+);
+
+create unlogged table if not exists public.stg_swgoh_unit
+(
+    base_id     text,
+    name        text,
+    url         text,
+    image       text,
+    description text,
+    combat_type text
+);
+
+create unlogged table if not exists public.stg_disc_channels
+(
+    channel_id   bigint,
+    channel_name text,
+    channel_type text,
+    topic        text,
+    nsfw         bool,
+    user_limit   double precision,
+    bitrate      double precision,
+    category     text,
+    removed_at   timestamptz
+);
+
+create unlogged table if not exists public.stg_disc_members
+(
+    member_id    bigint,
+    username     text,
+    display_name text,
+    joined_at    timestamptz,
+    removed_at   timestamptz
+);
+
+create unlogged table if not exists public.stg_disc_messages
+(
+    message_id      bigint,
+    channel         text,
+    user_id         bigint,
+    user_name       text,
+    nickname        text,
+    message_content text,
+    timestamp       timestamptz,
+    edited_at       timestamptz
+);
+
+-- Change-data-capture roster snapshots: one row per unit only on the days it changed,
+-- and a tombstone (removed, other columns null) on the day it left the roster
+create table if not exists public.f_swgoh_ss_player_cdc
+(
+    player_id     varchar(50) not null,
+    base_id       varchar(255) not null,
+    snapshot_date integer not null,
+    gear          integer,
+    relic         integer,
+    level         integer,
+    stars         integer,
+    gp            integer,
+    removed       bool not null default false,
+    primary key (player_id, base_id, snapshot_date)
+);
+
+-- Last stored state per unit, compared against the staging snapshot by insert_swgoh_ss_player_delta()
+create table if not exists public.swgoh_ss_player_state
+(
+    player_id     varchar(50) not null,
+    base_id       varchar(255) not null,
+    snapshot_date integer not null,
+    gear          integer,
+    relic         integer,
+    level         integer,
+    stars         integer,
+    gp            integer,
+    primary key (player_id, base_id)
+);
+
+-- Daily ticket rollup per guild/player, maintained by refresh_swgoh_tickets_daily() and read by the bot reports
+create table if not exists public.agg_swgoh_tickets_daily
+(
+    sk_guild       integer not null,
+    sk_player      integer not null,
+    date           date    not null,
+    tickets        integer not null,
+    tickets_missed integer not null,
+    primary key (sk_guild, sk_player, date)
+);
+
+create index if not exists agg_swgoh_tickets_daily_guild_date_idx
+    on public.agg_swgoh_tickets_daily (sk_guild, date);
+
+-- Bot report schedule: one row per guild/report, read by scheduler.Scheduler
+-- report_type: tickets (chart + missed tickets of the last `days` days), missed, messages (on-demand Discord backfill)
+-- cron: minute hour day-of-month month day-of-week (Sunday = 0), bot local time; channel_id null uses CHANNEL_ID
+create table if not exists public.bot_schedule
+(
+    id          serial primary key,
+    guild_id    varchar(255) not null,
+    guild_name  varchar(255),
+    report_type varchar(50)  not null,
+    cron        varchar(100) not null,
+    channel_id  bigint,
+    days        integer      not null default 0,
+    active      bool         not null default true,
+    last_run_at timestamp
+);
+
+-- Per-channel high-water mark of the message collection: last Discord message id loaded
+create table if not exists public.disc_channel_watermarks
+(
+    channel_id      bigint primary key,
+    channel_name    text,
+    last_message_id bigint    not null,
+    updated_at      timestamp not null default now()
+);
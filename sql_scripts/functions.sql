@@ -83,3 +83,151 @@ BEGIN
     ON CONFLICT (sk_guild, sk_player, sk_time) DO NOTHING;
 END $$;
 
+
+
+-- Writes the units whose tracked columns changed since the last snapshot, and a tombstone row (removed = true)
+-- for units that left a staged player's roster. With p_complete (every tracked roster was fetched), players
+-- missing from the snapshot are removed as well; otherwise a failed request could not be told apart from a departure.
+drop procedure if exists insert_swgoh_ss_player_delta();
+create or replace procedure insert_swgoh_ss_player_delta(p_complete boolean default false)
+    language plpgsql
+as
+$$
+DECLARE
+    v_snapshot_date integer;
+BEGIN
+    CREATE TEMP TABLE tmp_ss_player_changed ON COMMIT DROP AS
+    SELECT
+        stg.player_id,
+        stg.base_id,
+        CAST(stg.date AS int)   AS snapshot_date,
+        CAST(stg.gear AS int)   AS gear,
+        CAST(stg.relic AS int)  AS relic,
+        CAST(stg.level AS int)  AS level,
+        CAST(stg.stars AS int)  AS stars,
+        CAST(stg.gp AS int)     AS gp
+    FROM
+        stg_swgoh_ss_player stg
+    LEFT JOIN
+        swgoh_ss_player_state st ON st.player_id = stg.player_id AND st.base_id = stg.base_id
+    WHERE
+        st.player_id IS NULL
+        OR (st.gear, st.relic, st.level, st.stars, st.gp)
+           IS DISTINCT FROM (CAST(stg.gear AS int), CAST(stg.relic AS int), CAST(stg.level AS int),
+                             CAST(stg.stars AS int), CAST(stg.gp AS int));
+
+    INSERT INTO f_swgoh_ss_player_cdc (player_id, base_id, snapshot_date, gear, relic, level, stars, gp)
+    SELECT player_id, base_id, snapshot_date, gear, relic, level, stars, gp
+    FROM tmp_ss_player_changed
+    ON CONFLICT (player_id, base_id, snapshot_date) DO UPDATE
+        SET gear    = EXCLUDED.gear,
+            relic   = EXCLUDED.relic,
+            level   = EXCLUDED.level,
+            stars   = EXCLUDED.stars,
+            gp      = EXCLUDED.gp,
+            removed = FALSE;
+
+    INSERT INTO swgoh_ss_player_state (player_id, base_id, snapshot_date, gear, relic, level, stars, gp)
+    SELECT player_id, base_id, snapshot_date, gear, relic, level, stars, gp
+    FROM tmp_ss_player_changed
+    ON CONFLICT (player_id, base_id) DO UPDATE
+        SET snapshot_date = EXCLUDED.snapshot_date,
+            gear          = EXCLUDED.gear,
+            relic         = EXCLUDED.relic,
+            level         = EXCLUDED.level,
+            stars         = EXCLUDED.stars,
+            gp            = EXCLUDED.gp;
+
+    SELECT MAX(CAST(date AS int)) INTO v_snapshot_date FROM stg_swgoh_ss_player;
+    IF v_snapshot_date IS NULL THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO f_swgoh_ss_player_cdc (player_id, base_id, snapshot_date, removed)
+    SELECT st.player_id, st.base_id, v_snapshot_date, TRUE
+    FROM swgoh_ss_player_state st
+    WHERE (p_complete OR st.player_id IN (SELECT player_id FROM stg_swgoh_ss_player))
+      AND NOT EXISTS (SELECT 1
+                      FROM stg_swgoh_ss_player stg
+                      WHERE stg.player_id = st.player_id
+                        AND stg.base_id = st.base_id)
+    ON CONFLICT (player_id, base_id, snapshot_date) DO UPDATE
+        SET gear    = NULL,
+            relic   = NULL,
+            level   = NULL,
+            stars   = NULL,
+            gp      = NULL,
+            removed = TRUE;
+
+    DELETE FROM swgoh_ss_player_state st
+    USING f_swgoh_ss_player_cdc c
+    WHERE c.player_id = st.player_id
+      AND c.base_id = st.base_id
+      AND c.snapshot_date = v_snapshot_date
+      AND c.removed;
+END $$;
+
+
+-- Full roster as it was on p_date (YYYYMMDD), rebuilt from the change rows; units removed by then are left out
+create or replace function swgoh_ss_player_as_of(p_date integer)
+    returns table
+            (
+                player_id     varchar,
+                base_id       varchar,
+                snapshot_date integer,
+                gear          integer,
+                relic         integer,
+                level         integer,
+                stars         integer,
+                gp            integer
+            )
+    language sql
+    stable
+as
+$$
+    SELECT latest.player_id, latest.base_id, latest.snapshot_date, latest.gear, latest.relic, latest.level,
+           latest.stars, latest.gp
+    FROM (
+        SELECT DISTINCT ON (c.player_id, c.base_id)
+            c.player_id, c.base_id, c.snapshot_date, c.gear, c.relic, c.level, c.stars, c.gp, c.removed
+        FROM f_swgoh_ss_player_cdc c
+        WHERE c.snapshot_date <= p_date
+        ORDER BY c.player_id, c.base_id, c.snapshot_date DESC
+    ) latest
+    WHERE NOT latest.removed
+$$;
+
+create or replace view v_swgoh_ss_player_current as
+    SELECT player_id, base_id, snapshot_date, gear, relic, level, stars, gp
+    FROM swgoh_ss_player_state;
+
+
+-- Recomputes the rollup rows touched by the current stg_swgoh_tickets load; CALL refresh_swgoh_tickets_daily(true) rebuilds all history
+create or replace procedure refresh_swgoh_tickets_daily(p_full boolean default false)
+    language plpgsql
+as
+$$
+BEGIN
+    INSERT INTO agg_swgoh_tickets_daily (sk_guild, sk_player, date, tickets, tickets_missed)
+    SELECT
+        ft.sk_guild,
+        ft.sk_player,
+        CAST(dt."date" AS date)               AS date,
+        SUM(ft.tickets)                       AS tickets,
+        SUM(GREATEST(600 - ft.tickets, 0))    AS tickets_missed
+    FROM
+        f_swgoh_tickets ft
+    JOIN
+        d_time dt ON dt.id = ft.sk_time
+    WHERE
+        p_full
+        OR (ft.sk_time IN (SELECT DISTINCT CAST(stg.date AS int) FROM stg_swgoh_tickets stg)
+            AND ft.sk_guild IN (SELECT dg.id
+                                FROM d_swgoh_guild dg
+                                JOIN stg_swgoh_tickets stg ON stg.guild_id = dg.guild_id))
+    GROUP BY
+        ft.sk_guild, ft.sk_player, CAST(dt."date" AS date)
+    ON CONFLICT (sk_guild, sk_player, date) DO UPDATE
+        SET tickets        = EXCLUDED.tickets,
+            tickets_missed = EXCLUDED.tickets_missed;
+END $$;
@@ -5,4 +5,10 @@ INSERT INTO d_player (id, player_id, name, allycode, current_flag)
 VALUES (-1, 'UNKNOWN', 'Unknown Player', '000000000', FALSE);
 
 INSERT INTO d_time (id, date, year, quarter, month, day_of_month, day_of_week, is_weekend)
-VALUES (-1, '1970-01-01', 1970, 1, 1, 1, 1, FALSE);
\ No newline at end of file
+VALUES (-1, '1970-01-01', 1970, 1, 1, 1, 1, FALSE);
+
+INSERT INTO bot_schedule (guild_id, guild_name, report_type, cron, days)
+VALUES ('1HE3bh3LRcWVOto5KuGvzQ', 'Awakening Fear', 'tickets', '31 17 * * *', 0),
+       ('iO-khl_0TVu64OussT1Y7g', 'Awakening Hope', 'tickets', '31 22 * * *', 0),
+       ('1HE3bh3LRcWVOto5KuGvzQ', 'Awakening Fear', 'missed', '32 17 * * 0', 7),
+       ('iO-khl_0TVu64OussT1Y7g', 'Awakening Hope', 'missed', '32 22 * * 0', 7);
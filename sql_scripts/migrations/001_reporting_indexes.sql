@@ -0,0 +1,25 @@
+-- Indexes behind the report queries and the dimension lookups of the load procedures.
+-- Tables that do not exist in this database are skipped.
+DO
+$$
+BEGIN
+    -- Current-row lookups: stg.player_id = dp.player_id AND dp.current_flag = TRUE
+    IF to_regclass('public.d_swgoh_player') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS d_swgoh_player_current_idx ON d_swgoh_player (player_id) WHERE current_flag;
+    END IF;
+
+    IF to_regclass('public.d_swgoh_guild') IS NOT NULL THEN
+        CREATE UNIQUE INDEX IF NOT EXISTS d_swgoh_guild_guild_id_idx ON d_swgoh_guild (guild_id);
+    END IF;
+
+    -- Date range filters (dt."date" > current_date - 7)
+    IF to_regclass('public.d_time') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS d_time_date_idx ON d_time ("date");
+    END IF;
+
+    -- Per-guild time ranges on the ticket fact, and refresh_swgoh_tickets_daily's sk_time filter
+    IF to_regclass('public.f_swgoh_tickets') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS f_swgoh_tickets_guild_time_idx ON f_swgoh_tickets (sk_guild, sk_time);
+    END IF;
+END
+$$;
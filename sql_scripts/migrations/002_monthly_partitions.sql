@@ -0,0 +1,187 @@
+-- Monthly range partitioning of the facts on their time key.
+-- The keys are YYYYMMDD (sk_time and snapshot dates of the facts) or YYYYMMDDHH: the first key of a month is
+-- YYYYMM01 * scale, with scale 1 for daily keys and 100 for hourly keys. A check constraint rejects keys of any
+-- other width; only the unknown key (-1 or 0) lands in the <table>_pdefault partition.
+-- The facts are converted by `python migrate.py --partition` (sql_scripts/partition_facts.sql), not by a migration,
+-- since the conversion copies the whole table.
+
+CREATE SCHEMA IF NOT EXISTS archive;
+
+-- Partitioned facts and how their partition bounds are computed
+create table if not exists public.fact_partitioning
+(
+    table_name  text primary key,
+    column_name text   not null,
+    scale       bigint not null
+);
+
+create or replace function month_key(p_month date, p_scale bigint)
+    returns bigint
+    language sql
+    immutable
+as
+$$
+    SELECT (EXTRACT(YEAR FROM p_month)::bigint * 10000 + EXTRACT(MONTH FROM p_month)::bigint * 100 + 1) * p_scale
+$$;
+
+
+-- Check constraint expression accepting the unknown key (<= 0) and keys of the width given by p_scale
+create or replace function month_key_check(p_column text, p_scale bigint)
+    returns text
+    language sql
+    immutable
+as
+$$
+    SELECT format('%1$I <= 0 OR %1$I BETWEEN %2$s AND %3$s', p_column, 10000101 * p_scale, 99991231 * p_scale + p_scale - 1)
+$$;
+
+
+-- Creates <table>_pYYYYMM for the month of p_month if it does not exist yet
+create or replace procedure create_monthly_partition(p_table text, p_month date)
+    language plpgsql
+as
+$$
+DECLARE
+    v_scale bigint;
+    v_start date := date_trunc('month', p_month)::date;
+    v_name  text := format('%s_p%s', p_table, to_char(v_start, 'YYYYMM'));
+BEGIN
+    SELECT scale INTO STRICT v_scale FROM fact_partitioning WHERE table_name = p_table;
+    IF to_regclass(format('public.%I', v_name)) IS NULL THEN
+        EXECUTE format('CREATE TABLE public.%I PARTITION OF public.%I FOR VALUES FROM (%s) TO (%s)',
+                       v_name, p_table, month_key(v_start, v_scale),
+                       month_key((v_start + interval '1 month')::date, v_scale));
+    END IF;
+END $$;
+
+
+-- Converts an existing fact into a table partitioned by month on p_column, keeping its rows, indexes,
+-- check and foreign key constraints. The primary key must include p_column. Missing tables are skipped.
+create or replace procedure partition_by_month(p_table text, p_column text, p_scale bigint)
+    language plpgsql
+as
+$$
+DECLARE
+    v_legacy  text := p_table || '_unpartitioned';
+    v_min     bigint;
+    v_max     bigint;
+    v_month   date;
+    v_fk      record;
+    v_index   text;
+    v_invalid bigint;
+BEGIN
+    IF to_regclass(format('public.%I', p_table)) IS NULL THEN
+        RAISE NOTICE 'Table % does not exist, not partitioned.', p_table;
+        RETURN;
+    END IF;
+
+    IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                   WHERE table_schema = 'public' AND table_name = p_table AND column_name = p_column) THEN
+        RAISE NOTICE 'Table % has no column %, not partitioned.', p_table, p_column;
+        RETURN;
+    END IF;
+
+    INSERT INTO fact_partitioning (table_name, column_name, scale)
+    VALUES (p_table, p_column, p_scale)
+    ON CONFLICT (table_name) DO UPDATE SET column_name = EXCLUDED.column_name, scale = EXCLUDED.scale;
+
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = format('public.%I', p_table)::regclass) THEN
+        RAISE NOTICE 'Table % is already partitioned.', p_table;
+        RETURN;
+    END IF;
+
+    -- Unique indexes of a partitioned table must contain the partition key
+    IF EXISTS (SELECT 1 FROM pg_index ix
+               WHERE ix.indrelid = format('public.%I', p_table)::regclass AND ix.indisunique
+                 AND NOT EXISTS (SELECT 1 FROM pg_attribute att
+                                 WHERE att.attrelid = ix.indrelid AND att.attname = p_column
+                                   AND att.attnum = ANY (ix.indkey))) THEN
+        DELETE FROM fact_partitioning WHERE table_name = p_table;
+        RAISE NOTICE 'Table % has a unique key without %, not partitioned.', p_table, p_column;
+        RETURN;
+    END IF;
+
+    -- Keys of another width (e.g. hourly keys with scale 1) would all fall into the default partition
+    EXECUTE format('SELECT count(*) FROM public.%I WHERE NOT (%s)', p_table, month_key_check(p_column, p_scale))
+        INTO v_invalid;
+    IF v_invalid > 0 THEN
+        RAISE EXCEPTION 'Table % has % rows whose % does not match scale %.', p_table, v_invalid, p_column, p_scale;
+    END IF;
+
+    EXECUTE format('ALTER TABLE public.%I RENAME TO %I', p_table, v_legacy);
+    -- Free the index names (e.g. <table>_pkey) for the partitioned table
+    FOR v_index IN SELECT indexrelid::regclass::text FROM pg_index
+                   WHERE indrelid = format('public.%I', v_legacy)::regclass
+    LOOP
+        EXECUTE format('ALTER INDEX %s RENAME TO %I', v_index, left(v_index, 48) || '_unpartitioned');
+    END LOOP;
+    EXECUTE format('CREATE TABLE public.%I (LIKE public.%I INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING INDEXES) '
+                   'PARTITION BY RANGE (%I)', p_table, v_legacy, p_column);
+    FOR v_fk IN SELECT conname, pg_get_constraintdef(oid) AS definition
+                FROM pg_constraint
+                WHERE conrelid = format('public.%I', v_legacy)::regclass AND contype = 'f'
+    LOOP
+        EXECUTE format('ALTER TABLE public.%I ADD CONSTRAINT %I %s', p_table, v_fk.conname, v_fk.definition);
+    END LOOP;
+    EXECUTE format('ALTER TABLE public.%I ADD CONSTRAINT %I CHECK (%s)', p_table, left(p_table, 48) || '_key_width_check',
+                   month_key_check(p_column, p_scale));
+    EXECUTE format('CREATE TABLE public.%I PARTITION OF public.%I DEFAULT', p_table || '_pdefault', p_table);
+
+    -- One partition per month from the oldest row up to the current month
+    EXECUTE format('SELECT min(%1$I), max(%1$I) FROM public.%2$I WHERE %1$I > 0', p_column, v_legacy)
+        INTO v_min, v_max;
+    v_month := date_trunc('month', COALESCE(to_date((v_min / p_scale)::text, 'YYYYMMDD'), current_date))::date;
+    WHILE v_month <= GREATEST(COALESCE(to_date((v_max / p_scale)::text, 'YYYYMMDD'), current_date), current_date) LOOP
+        CALL create_monthly_partition(p_table, v_month);
+        v_month := (v_month + interval '1 month')::date;
+    END LOOP;
+
+    EXECUTE format('INSERT INTO public.%I SELECT * FROM public.%I', p_table, v_legacy);
+    EXECUTE format('DROP TABLE public.%I', v_legacy);
+    EXECUTE format('ANALYZE public.%I', p_table);
+END $$;
+
+
+-- Creates the partitions of the current month and the next p_months_ahead months for every partitioned fact.
+-- Called by migrate.run_migrations, so every loader run keeps the partitions ahead of the data.
+create or replace procedure ensure_monthly_partitions(p_months_ahead integer default 3)
+    language plpgsql
+as
+$$
+DECLARE
+    v_table text;
+BEGIN
+    FOR v_table IN SELECT table_name FROM fact_partitioning WHERE to_regclass(format('public.%I', table_name)) IS NOT NULL
+    LOOP
+        FOR i IN 0..p_months_ahead LOOP
+            CALL create_monthly_partition(v_table, (date_trunc('month', current_date) + make_interval(months => i))::date);
+        END LOOP;
+    END LOOP;
+END $$;
+
+
+-- Detaches the monthly partitions older than p_keep_months and moves them to the archive schema, where they
+-- can be dumped and dropped. Queries on the facts stop scanning them; ATTACH PARTITION brings one back.
+create or replace procedure archive_monthly_partitions(p_keep_months integer)
+    language plpgsql
+as
+$$
+DECLARE
+    v_partition record;
+    v_cutoff    date := (date_trunc('month', current_date) - make_interval(months => p_keep_months))::date;
+BEGIN
+    FOR v_partition IN
+        SELECT fp.table_name, child.relname AS partition_name
+        FROM fact_partitioning fp
+        JOIN pg_inherits inh ON inh.inhparent = format('public.%I', fp.table_name)::regclass
+        JOIN pg_class child ON child.oid = inh.inhrelid
+        WHERE child.relname ~ '_p\d{6}$'
+          AND to_date(right(child.relname, 6), 'YYYYMM') < v_cutoff
+        ORDER BY child.relname
+    LOOP
+        EXECUTE format('ALTER TABLE public.%I DETACH PARTITION public.%I', v_partition.table_name,
+                       v_partition.partition_name);
+        EXECUTE format('ALTER TABLE public.%I SET SCHEMA archive', v_partition.partition_name);
+        RAISE NOTICE 'Archived partition % of %.', v_partition.partition_name, v_partition.table_name;
+    END LOOP;
+END $$;
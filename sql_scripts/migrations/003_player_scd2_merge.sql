@@ -0,0 +1,129 @@
+-- Set-based SCD2 merge of the player dimension, driven by a hash of the tracked attributes (name, allycode, guild).
+-- Names are unqualified so benchmarks/bench_player_scd2.py can install it in its own schema through search_path.
+DO
+$$
+BEGIN
+    IF to_regclass('d_swgoh_player') IS NULL THEN
+        RAISE NOTICE 'Table d_swgoh_player does not exist, merge columns not added.';
+        RETURN;
+    END IF;
+
+    ALTER TABLE d_swgoh_player ADD COLUMN IF NOT EXISTS guild_id varchar(255);
+    ALTER TABLE d_swgoh_player ADD COLUMN IF NOT EXISTS row_hash char(32);
+
+    -- Current guild of the existing rows, from their latest ticket row, so the first merge does not version
+    -- every player just because the guild was unknown
+    IF to_regclass('f_swgoh_tickets') IS NOT NULL AND to_regclass('d_swgoh_guild') IS NOT NULL THEN
+        UPDATE d_swgoh_player dp
+        SET guild_id = dg.guild_id
+        FROM (SELECT DISTINCT ON (sk_player) sk_player, sk_guild
+              FROM f_swgoh_tickets
+              ORDER BY sk_player, sk_time DESC) ft
+        JOIN d_swgoh_guild dg ON dg.id = ft.sk_guild
+        WHERE ft.sk_player = dp.id
+          AND dp.guild_id IS NULL;
+    END IF;
+
+    UPDATE d_swgoh_player
+    SET row_hash = md5(row (name, allycode, guild_id)::text)
+    WHERE row_hash IS NULL;
+
+    CREATE INDEX IF NOT EXISTS d_swgoh_player_current_idx ON d_swgoh_player (player_id) WHERE current_flag;
+END
+$$;
+
+
+-- Merges stg_swgoh_player (restricted to p_guild_id when given) into d_swgoh_player with a single join against
+-- the current rows:
+--   new player                 -> inserted
+--   hash changed               -> current row expired (end_date yesterday), new version inserted
+--   hash changed the same day  -> current row overwritten in place (counted as inserted)
+--   hash unchanged             -> unchanged
+--   current row in p_guild_id but not in p_members (left the guild) -> expired; end_date is today if it started today
+--   no current row, but one valid only today (left and came back the same day) -> reopened in place
+-- p_members is the guild member list. Members missing from the staging (e.g. their player request failed) keep
+-- their current row; without p_members every current row of p_guild_id missing from the staging is expired.
+-- A player who moved keeps one current row: the run of either guild versions or expires it.
+drop function if exists merge_swgoh_players(text);
+create or replace function merge_swgoh_players(p_guild_id text default null, p_members text[] default null)
+    returns table
+            (
+                inserted  integer,
+                expired   integer,
+                unchanged integer
+            )
+    language plpgsql
+as
+$$
+BEGIN
+    CREATE TEMP TABLE tmp_player_merge ON COMMIT DROP AS
+    SELECT
+        COALESCE(src.player_id, cur.player_id) AS player_id,
+        src.name,
+        src.allycode,
+        src.guild_id,
+        src.row_hash,
+        COALESCE(cur.id, closed.id)            AS current_id,
+        CASE
+            WHEN cur.id IS NULL AND closed.id IS NOT NULL THEN 'reopen'
+            WHEN cur.id IS NULL THEN 'new'
+            WHEN src.player_id IS NULL THEN 'left'
+            WHEN cur.row_hash = src.row_hash THEN 'unchanged'
+            WHEN cur.start_date = CURRENT_DATE THEN 'overwrite'
+            ELSE 'changed'
+        END                                    AS action
+    FROM (
+        SELECT DISTINCT ON (stg.player_id)
+            stg.player_id,
+            stg.name,
+            stg.allycode,
+            stg.guild_id,
+            md5(row (stg.name, stg.allycode, stg.guild_id)::text) AS row_hash
+        FROM stg_swgoh_player stg
+        WHERE p_guild_id IS NULL OR stg.guild_id = p_guild_id
+        ORDER BY stg.player_id
+    ) src
+    FULL JOIN (
+        SELECT id, player_id, guild_id, row_hash, start_date
+        FROM d_swgoh_player
+        WHERE current_flag
+    ) cur ON cur.player_id = src.player_id
+    LEFT JOIN d_swgoh_player closed
+        ON closed.player_id = src.player_id
+        AND closed.start_date = CURRENT_DATE
+        AND NOT closed.current_flag
+    WHERE src.player_id IS NOT NULL
+       OR (cur.guild_id = p_guild_id AND (p_members IS NULL OR cur.player_id <> ALL (p_members)));
+
+    UPDATE d_swgoh_player d
+    SET end_date     = GREATEST(CURRENT_DATE - 1, d.start_date),
+        current_flag = FALSE
+    FROM tmp_player_merge m
+    WHERE d.id = m.current_id
+      AND m.action IN ('changed', 'left');
+
+    UPDATE d_swgoh_player d
+    SET name         = m.name,
+        allycode     = m.allycode,
+        guild_id     = m.guild_id,
+        row_hash     = m.row_hash,
+        end_date     = NULL,
+        current_flag = TRUE
+    FROM tmp_player_merge m
+    WHERE d.id = m.current_id
+      AND m.action IN ('overwrite', 'reopen');
+
+    INSERT INTO d_swgoh_player (player_id, name, allycode, guild_id, row_hash, start_date, end_date, current_flag)
+    SELECT player_id, name, allycode, guild_id, row_hash, CURRENT_DATE, NULL, TRUE
+    FROM tmp_player_merge
+    WHERE action IN ('new', 'changed');
+
+    RETURN QUERY
+    SELECT
+        COUNT(*) FILTER (WHERE action IN ('new', 'changed', 'overwrite', 'reopen'))::integer,
+        COUNT(*) FILTER (WHERE action IN ('changed', 'left'))::integer,
+        COUNT(*) FILTER (WHERE action = 'unchanged')::integer
+    FROM tmp_player_merge;
+
+    DROP TABLE tmp_player_merge;
+END $$;
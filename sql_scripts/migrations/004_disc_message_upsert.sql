@@ -0,0 +1,45 @@
+-- Discord messages keyed on their message id, so edits captured by disc_capture.DiscordCapture can be applied.
+-- insert_discord_messages() only appends, so upsert_discord_messages() keeps one row per message in
+-- f_disc_messages: a new message is inserted, and a later edit replaces its content.
+ALTER TABLE IF EXISTS stg_disc_messages ADD COLUMN IF NOT EXISTS message_id bigint;
+ALTER TABLE IF EXISTS stg_disc_messages ADD COLUMN IF NOT EXISTS edited_at timestamptz;
+
+create table if not exists public.f_disc_messages
+(
+    message_id      bigint primary key,
+    channel         text,
+    user_id         bigint,
+    user_name       text,
+    nickname        text,
+    message_content text,
+    created_at      timestamptz,
+    edited_at       timestamptz
+);
+
+
+create or replace procedure upsert_discord_messages()
+    language plpgsql
+as
+$$
+BEGIN
+    INSERT INTO f_disc_messages (message_id, channel, user_id, user_name, nickname, message_content, created_at,
+                                 edited_at)
+    SELECT DISTINCT ON (stg.message_id)
+        stg.message_id,
+        stg.channel,
+        stg.user_id,
+        stg.user_name,
+        stg.nickname,
+        stg.message_content,
+        stg."timestamp",
+        stg.edited_at
+    FROM stg_disc_messages stg
+    WHERE stg.message_id IS NOT NULL
+    ORDER BY stg.message_id, stg.edited_at DESC NULLS LAST
+    ON CONFLICT (message_id) DO UPDATE
+        SET message_content = EXCLUDED.message_content,
+            edited_at       = EXCLUDED.edited_at
+        -- Only a newer edit replaces the content (a backfill may read a message again)
+        WHERE EXCLUDED.edited_at IS NOT NULL
+          AND (f_disc_messages.edited_at IS NULL OR EXCLUDED.edited_at > f_disc_messages.edited_at);
+END $$;
@@ -0,0 +1,93 @@
+-- Current channels and members of the captured Discord server, including the removed ones.
+-- disc_capture.DiscordCapture stages a tombstone (the key and removed_at) for each deleted channel or departed
+-- member; merge_discord_channels() and merge_discord_members() flag those rows inactive and upsert the others.
+ALTER TABLE IF EXISTS stg_disc_channels ADD COLUMN IF NOT EXISTS removed_at timestamptz;
+ALTER TABLE IF EXISTS stg_disc_members ADD COLUMN IF NOT EXISTS removed_at timestamptz;
+
+create table if not exists public.disc_channel_state
+(
+    channel_id   bigint primary key,
+    channel_name text,
+    channel_type text,
+    topic        text,
+    nsfw         bool,
+    user_limit   double precision,
+    bitrate      double precision,
+    category     text,
+    active       bool      not null default true,
+    removed_at   timestamptz,
+    updated_at   timestamp not null default now()
+);
+
+create table if not exists public.disc_member_state
+(
+    member_id    bigint primary key,
+    username     text,
+    display_name text,
+    joined_at    timestamptz,
+    active       bool      not null default true,
+    removed_at   timestamptz,
+    updated_at   timestamp not null default now()
+);
+
+
+create or replace procedure merge_discord_channels()
+    language plpgsql
+as
+$$
+BEGIN
+    -- Tombstones keep the last known attributes; a repeated tombstone keeps the first removal time
+    UPDATE disc_channel_state st
+    SET active     = FALSE,
+        removed_at = COALESCE(st.removed_at, stg.removed_at),
+        updated_at = now()
+    FROM stg_disc_channels stg
+    WHERE stg.channel_id = st.channel_id
+      AND stg.removed_at IS NOT NULL;
+
+    INSERT INTO disc_channel_state (channel_id, channel_name, channel_type, topic, nsfw, user_limit, bitrate, category)
+    SELECT DISTINCT ON (channel_id) channel_id, channel_name, channel_type, topic, nsfw, user_limit, bitrate, category
+    FROM stg_disc_channels
+    WHERE removed_at IS NULL
+    ORDER BY channel_id
+    ON CONFLICT (channel_id) DO UPDATE
+        SET channel_name = EXCLUDED.channel_name,
+            channel_type = EXCLUDED.channel_type,
+            topic        = EXCLUDED.topic,
+            nsfw         = EXCLUDED.nsfw,
+            user_limit   = EXCLUDED.user_limit,
+            bitrate      = EXCLUDED.bitrate,
+            category     = EXCLUDED.category,
+            active       = TRUE,
+            removed_at   = NULL,
+            updated_at   = now();
+END $$;
+
+
+create or replace procedure merge_discord_members()
+    language plpgsql
+as
+$$
+BEGIN
+    UPDATE disc_member_state st
+    SET active     = FALSE,
+        removed_at = COALESCE(st.removed_at, stg.removed_at),
+        updated_at = now()
+    FROM stg_disc_members stg
+    WHERE stg.member_id = st.member_id
+      AND stg.removed_at IS NOT NULL;
+
+    -- A member who rejoins is active again
+    INSERT INTO disc_member_state (member_id, username, display_name, joined_at)
+    SELECT DISTINCT ON (member_id) member_id, username, display_name, joined_at
+    FROM stg_disc_members
+    WHERE removed_at IS NULL
+    ORDER BY member_id
+    ON CONFLICT (member_id) DO UPDATE
+        SET username     = EXCLUDED.username,
+            display_name = EXCLUDED.display_name,
+            joined_at    = EXCLUDED.joined_at,
+            active       = TRUE,
+            removed_at   = NULL,
+            updated_at   = now();
+END $$;
@@ -0,0 +1,3 @@
+-- Tombstone flag of the roster change rows, written by insert_swgoh_ss_player_delta() (sql_scripts/functions.sql)
+-- when a unit leaves a roster or a player leaves the snapshot.
+ALTER TABLE IF EXISTS f_swgoh_ss_player_cdc ADD COLUMN IF NOT EXISTS removed bool NOT NULL DEFAULT false;
@@ -0,0 +1,45 @@
+-- Rows of months without a partition yet also land in the <table>_pdefault partition (not only the unknown key, as
+-- 002_monthly_partitions.sql states), and creating the partition of such a month then fails. The partition is now
+-- created after moving those rows out of the default partition, and they are inserted back into it.
+create or replace procedure create_monthly_partition(p_table text, p_month date)
+    language plpgsql
+as
+$$
+DECLARE
+    v_column  text;
+    v_scale   bigint;
+    v_start   date := date_trunc('month', p_month)::date;
+    v_name    text := format('%s_p%s', p_table, to_char(v_start, 'YYYYMM'));
+    v_default text := p_table || '_pdefault';
+    v_from    bigint;
+    v_to      bigint;
+    v_moved   boolean := false;
+BEGIN
+    SELECT column_name, scale INTO STRICT v_column, v_scale FROM fact_partitioning WHERE table_name = p_table;
+    IF to_regclass(format('public.%I', v_name)) IS NOT NULL THEN
+        RETURN;
+    END IF;
+
+    v_from := month_key(v_start, v_scale);
+    v_to := month_key((v_start + interval '1 month')::date, v_scale);
+    IF to_regclass(format('public.%I', v_default)) IS NOT NULL THEN
+        EXECUTE format('SELECT EXISTS (SELECT 1 FROM public.%I WHERE %I >= %s AND %I < %s)',
+                       v_default, v_column, v_from, v_column, v_to)
+            INTO v_moved;
+    END IF;
+    IF v_moved THEN
+        EXECUTE format('CREATE TEMP TABLE partition_rows_moved (LIKE public.%I) ON COMMIT DROP', p_table);
+        EXECUTE format('WITH moved AS (DELETE FROM public.%I WHERE %I >= %s AND %I < %s RETURNING *) '
+                       'INSERT INTO partition_rows_moved SELECT * FROM moved',
+                       v_default, v_column, v_from, v_column, v_to);
+    END IF;
+
+    EXECUTE format('CREATE TABLE public.%I PARTITION OF public.%I FOR VALUES FROM (%s) TO (%s)',
+                   v_name, p_table, v_from, v_to);
+
+    IF v_moved THEN
+        EXECUTE format('INSERT INTO public.%I SELECT * FROM partition_rows_moved', p_table);
+        DROP TABLE partition_rows_moved;
+        RAISE NOTICE 'Moved the rows of % from % to %.', to_char(v_start, 'YYYY-MM'), v_default, v_name;
+    END IF;
+END $$;
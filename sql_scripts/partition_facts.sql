@@ -0,0 +1,8 @@
+-- Ticket, raid and roster-snapshot facts partitioned by month (see migrations/002_monthly_partitions.sql).
+-- Run explicitly with `python migrate.py --partition`: each conversion copies the whole table under an exclusive lock.
+-- All keys are daily (YYYYMMDD), so the scale is 1.
+-- Tables that do not exist are skipped.
+CALL partition_by_month('f_swgoh_tickets', 'sk_time', 1);
+CALL partition_by_month('f_raid_result', 'sk_time', 1);
+CALL partition_by_month('f_swgoh_ss_player', 'sk_time', 1);
+CALL partition_by_month('f_swgoh_ss_player_cdc', 'snapshot_date', 1);